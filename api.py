@@ -0,0 +1,208 @@
+"""
+API HTTP headless du chatbot (Server-Sent Events).
+
+    python api.py --workers 4 --port 8000
+
+Le processus principal charge une seule fois l'index FAISS préconstruit du corpus
+par défaut, crée la file d'admission du LLM puis se duplique (fork) : les workers
+partagent ces données en lecture seule et la même file d'admission. Avant le fork,
+aucun thread n'est démarré, ni le modèle d'embedding (torch/OpenMP ne survivent pas
+à un fork) ni connexion à la base ne sont ouverts : un index absent ou obsolète est
+construit dans un sous-processus par backend.index_builder ; modèle d'embedding,
+catalogue, pré-calcul des réponses et préchauffage du LLM sont pris en charge par
+les workers.
+Les autres corpus (corpora.json) sont chargés par chaque worker à leur première
+requête, dans la limite de CORPUS_MEMORY_BUDGET_MB.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import uvicorn
+from backend.corpus_manager import CorpusManager
+from backend.admission import get_admission_queue
+from backend.index_builder import read_manifest, verify, compatibility_problems
+from backend.memory_stats import snapshot as memory_snapshot
+
+load_dotenv()
+
+
+class QueryRequest(BaseModel):
+    question: str
+    # False : toujours générer, même si la réponse extractive de repli serait plus rapide
+    allow_fallback: bool = True
+    # Identifiant de corpora.json ; corpus par défaut si absent
+    corpus: Optional[str] = None
+    # Filtres de métadonnées des documents, ex. {"academic_year": "2024-2025"}
+    filters: Optional[dict] = None
+
+
+app = FastAPI(title="Chatbot FS-UEb API")
+manager = None
+started_at = time.time()
+
+
+def ensure_prebuilt(corpus_id, config):
+    """Construit l'index du corpus dans un sous-processus s'il est absent ou obsolète."""
+    manifest = read_manifest(config["index_dir"])
+    if manifest is not None:
+        problems = compatibility_problems(manifest) or verify(config["index_dir"], manifest)
+        if not problems:
+            return
+        print(f"Index préconstruit de {corpus_id} à refaire : {', '.join(problems)}")
+    subprocess.run([sys.executable, "-m", "backend.index_builder", "--corpus", corpus_id], check=True)
+
+
+def load_logic():
+    """Charge le corpus par défaut dans le processus principal, avant le fork : sans
+    watcher (index en lecture seule), sans thread de fond, sans modèle d'embedding
+    (chargé au premier calcul) ni connexion au catalogue (ouverte au premier usage)."""
+    global manager
+    manager = CorpusManager(watch=False, background=False)
+    ensure_prebuilt(manager.default, manager.corpora[manager.default])
+    return manager.get()
+
+
+def start_worker(worker_id):
+    """Tâches de fond d'un worker, après le fork ; le pré-calcul n'a lieu que dans le premier."""
+    if worker_id == 0:
+        manager.start_background()
+    logic = manager.get()
+    logic.preload_embeddings()
+    logic.preload_model()
+
+
+def get_logic(corpus=None):
+    try:
+        return manager.get(corpus)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Corpus inconnu : {corpus}")
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/query")
+def query(request: QueryRequest):
+    logic = get_logic(request.corpus)
+
+    def events():
+        for msg_type, content in logic.run_query_with_status(
+            request.question, request.allow_fallback, request.filters, pace=False
+        ):
+            yield _sse(msg_type, content if isinstance(content, dict) else {"text": content})
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/corpora/{corpus}/query")
+def corpus_query(corpus: str, request: QueryRequest):
+    request.corpus = corpus
+    return query(request)
+
+
+@app.get("/corpora")
+def corpora():
+    return {
+        "default": manager.default,
+        "corpora": {corpus_id: config["name"] for corpus_id, config in manager.corpora.items()},
+        "stats": manager.stats(),
+    }
+
+
+@app.get("/health")
+def health():
+    logic = manager.get() if manager else None
+    return {
+        "status": "ok" if logic and logic.retriever else "degraded",
+        "pid": os.getpid(),
+        "uptime": time.time() - started_at,
+    }
+
+
+@app.get("/index/version")
+def index_version(corpus: Optional[str] = None):
+    logic = get_logic(corpus)
+    return {
+        "index_version": logic.index_version,
+        "chunks": len(logic.texts or []),
+        "fingerprint": logic.index_fingerprint(),
+        "prebuilt": logic.manifest is not None,
+    }
+
+
+@app.get("/cache/stats")
+def cache_stats(corpus: Optional[str] = None):
+    logic = get_logic(corpus)
+    return {
+        "cached_responses": len(logic.cache_responses),
+        "retrieval": logic.retrieval_cache.stats(),
+        "llm": logic.llm_manager.stats(),
+        "routing": logic.router.stats(),
+        "admission": logic.admission.stats(),
+        "degradation": logic.degradation.stats(),
+        "corpora": manager.stats(),
+    }
+
+
+@app.get("/memory")
+def memory():
+    return memory_snapshot()
+
+
+def serve(host, port, workers):
+    # Créée avant le chargement : les logiques de corpus gardent la file partagée
+    get_admission_queue(shared=True)
+    load_logic()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = []
+    for worker_id in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            start_worker(worker_id)
+            server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+            server.run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+
+    def _terminate(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API headless du Chatbot FS-UEb")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
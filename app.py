@@ -1,10 +1,9 @@
 import streamlit as st
 from views.login import LoginPage
 from views.register import RegisterPage
-from views.chatbot import OptimizedChatbotUI
-from views.admin import AdminPage
 from dotenv import load_dotenv
 from utils.cookies import set_cookie, get_cookie
+from utils.lazy_imports import preload_in_background
 from backend.auth import AuthManager
 import os
 import pickle
@@ -73,6 +72,11 @@ def main():
 
     save_session_state()
 
+    if st.session_state.page in ["login", "register"]:
+        # Les pages d'authentification n'importent aucune bibliothèque ML ;
+        # la pile du chatbot se charge en arrière-plan pendant ce temps.
+        preload_in_background()
+
     if st.session_state.page == "login":
         login_page = LoginPage()
         login_page.render()
@@ -91,10 +95,12 @@ def main():
         else:
             role = st.session_state.get("role")
             if role == "admin":
+                from views.admin import AdminPage
                 admin_ui = AdminPage()
                 admin_ui.render()
             else:
-                app_ui = OptimizedChatbotUI(pdf_folder="pdfs")
+                from views.chatbot import OptimizedChatbotUI
+                app_ui = OptimizedChatbotUI()
                 app_ui.render()
 
             if st.sidebar.button("🚪 Déconnexion", key="logout_button"):
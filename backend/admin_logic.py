@@ -1,26 +1,77 @@
 import os
 import shutil
 from datetime import datetime
+from backend.document_catalog import DocumentCatalog
 
 PDF_FOLDER = "pdfs"
 
 class AdminLogic:
-    def __init__(self):
-        os.makedirs(PDF_FOLDER, exist_ok=True)
+    def __init__(self, pdf_folder=PDF_FOLDER, catalog_table="documents"):
+        self.pdf_folder = pdf_folder
+        os.makedirs(self.pdf_folder, exist_ok=True)
+        self.catalog = DocumentCatalog(catalog_table)
+        self._catalog_checked = False
 
     def save_pdf(self, file):
         """Ajoute un nouveau PDF (ou remplace s’il existe déjà)."""
-        save_path = os.path.join(PDF_FOLDER, file.name)
+        save_path = os.path.join(self.pdf_folder, file.name)
         with open(save_path, "wb") as f:
             f.write(file.getbuffer())
+        self.catalog.register_file(save_path)
         return save_path
 
-    def list_pdfs(self):
-        """Retourne les PDFs existants avec infos (taille, date modif)."""
-        files = [f for f in os.listdir(PDF_FOLDER) if f.endswith(".pdf")]
+    def _ensure_catalog(self):
+        """Sur un déploiement existant la table démarre vide : on y reporte les PDFs présents
+        (vérifié une seule fois par instance)."""
+        if self._catalog_checked:
+            return
+        self._catalog_checked = True
+        if self.catalog.available and not self.catalog.count():
+            self.sync_catalog()
+
+    def count_pdfs(self):
+        self._ensure_catalog()
+        if self.catalog.available:
+            return self.catalog.count()
+        return len([f for f in os.listdir(self.pdf_folder) if f.endswith(".pdf")])
+
+    def list_pdfs(self, page=1, per_page=20, sort_by="name", descending=False):
+        """Retourne une page de PDFs depuis le catalogue (taille, date, état d'ingestion)."""
+        if not self.catalog.available:
+            return self._scan_pdfs()
+        self._ensure_catalog()
+        result = []
+        for row in self.catalog.list(page, per_page, sort_by, descending):
+            result.append({
+                "name": row["name"],
+                "path": os.path.join(self.pdf_folder, row["name"]),
+                "size": f"{(row['size_bytes'] or 0) / 1024:.2f} Ko",
+                "modified": row["modified_at"].strftime("%d/%m/%Y %H:%M") if row["modified_at"] else "-",
+                "status": row["status"],
+                "error": row["error"],
+                "pages": row["page_count"],
+                "chunks": row["chunk_count"],
+                "extraction_seconds": row["extraction_seconds"],
+                "embedding_seconds": row["embedding_seconds"],
+            })
+        return result
+
+    def sync_catalog(self):
+        """Ajoute au catalogue les PDFs présents sur disque mais encore inconnus."""
+        known = {row["name"] for row in self.catalog.list(1, self.catalog.count() or 1)}
+        added = 0
+        for f in os.listdir(self.pdf_folder):
+            if f.endswith(".pdf") and f not in known:
+                self.catalog.register_file(os.path.join(self.pdf_folder, f))
+                added += 1
+        return added
+
+    def _scan_pdfs(self):
+        """Repli sans base de données : parcours du dossier."""
+        files = [f for f in os.listdir(self.pdf_folder) if f.endswith(".pdf")]
         result = []
         for f in files:
-            path = os.path.join(PDF_FOLDER, f)
+            path = os.path.join(self.pdf_folder, f)
             size = os.path.getsize(path) / 1024  
             mod_time = datetime.fromtimestamp(os.path.getmtime(path))
             result.append({
@@ -33,23 +84,28 @@ class AdminLogic:
 
     def delete_pdf(self, filename):
         """Supprime un PDF existant."""
-        path = os.path.join(PDF_FOLDER, filename)
+        path = os.path.join(self.pdf_folder, filename)
         if os.path.exists(path):
             os.remove(path)
+            self.catalog.delete(filename)
             return True
         return False
 
     def replace_pdf(self, old_filename, new_file):
         """Remplace un PDF existant par un nouveau fichier."""
-        old_path = os.path.join(PDF_FOLDER, old_filename)
+        old_path = os.path.join(self.pdf_folder, old_filename)
         if os.path.exists(old_path):
             os.remove(old_path)
+            self.catalog.delete(old_filename)
         return self.save_pdf(new_file)
 
     def clear_all(self):
         """Supprime tous les PDFs."""
-        shutil.rmtree(PDF_FOLDER)
-        os.makedirs(PDF_FOLDER, exist_ok=True)
+        for f in os.listdir(self.pdf_folder):
+            if f.endswith(".pdf"):
+                self.catalog.delete(f)
+        shutil.rmtree(self.pdf_folder)
+        os.makedirs(self.pdf_folder, exist_ok=True)
 
     def reindex(self):
         """⚡ Stub pour reindexer la base (à connecter avec chatbot_logic)."""
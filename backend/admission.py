@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "1"))
+
+
+WAITING, ACTIVE, ADMITTED, TOTAL_WAIT, BACKGROUND = range(5)
+
+
+class Preempted(Exception):
+    """Génération de fond interrompue pour laisser la place à une requête d'utilisateur."""
+
+
+class AdmissionQueue:
+    """
+    File d'admission des générations vers Ollama. Par défaut les primitives sont
+    celles de threading (sessions d'un même processus, compatible Windows). Avec
+    `shared=True` elles sont créées via multiprocessing (fork) : créée avant le fork
+    de l'API, la même file est partagée par tous les workers.
+    """
+
+    def __init__(self, max_concurrent=LLM_MAX_CONCURRENT, shared=False):
+        self.max_concurrent = max_concurrent
+        self.shared = shared
+        if shared:
+            ctx = multiprocessing.get_context("fork")
+            self._slots = ctx.BoundedSemaphore(max_concurrent)
+            self._lock = ctx.Lock()
+            self._counters = ctx.Array("d", 5, lock=False)
+        else:
+            self._slots = threading.BoundedSemaphore(max_concurrent)
+            self._lock = threading.Lock()
+            self._counters = [0.0] * 5
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Attend une place libre ; lève TimeoutError si `timeout` est dépassé."""
+        with self._lock:
+            self._counters[WAITING] += 1
+        start = time.time()
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self._counters[WAITING] -= 1
+        if not acquired:
+            raise TimeoutError("File d'attente du modèle saturée")
+        with self._lock:
+            self._counters[ACTIVE] += 1
+            self._counters[ADMITTED] += 1
+            self._counters[TOTAL_WAIT] += time.time() - start
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._counters[ACTIVE] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def background_slot(self):
+        """Place pour une génération de fond (pré-calcul) : prise seulement si personne
+        n'attend ni ne génère, comptée à part (jamais « devant » un utilisateur) ;
+        `yield_if_needed()` doit être appelé entre deux fragments pour céder la place."""
+        if self.busy() or not self._slots.acquire(blocking=False):
+            raise Preempted("Modèle occupé par des requêtes d'utilisateurs")
+        with self._lock:
+            self._counters[BACKGROUND] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._counters[BACKGROUND] -= 1
+            self._slots.release()
+
+    def busy(self):
+        """Vrai si une requête d'utilisateur attend ou génère."""
+        with self._lock:
+            return self._counters[WAITING] > 0 or self._counters[ACTIVE] > 0
+
+    def yield_if_needed(self):
+        """Lève Preempted dès qu'un utilisateur attend une place."""
+        with self._lock:
+            waiting = self._counters[WAITING]
+        if waiting > 0:
+            raise Preempted("Requête d'utilisateur en attente")
+
+    def stats(self):
+        with self._lock:
+            admitted = int(self._counters[ADMITTED])
+            return {
+                "max_concurrent": self.max_concurrent,
+                "shared": self.shared,
+                "active": int(self._counters[ACTIVE]),
+                "waiting": int(self._counters[WAITING]),
+                "background": int(self._counters[BACKGROUND]),
+                "admitted": admitted,
+                "avg_wait": self._counters[TOTAL_WAIT] / admitted if admitted else 0.0,
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_admission_queue(shared=False):
+    """File unique par processus. L'API la demande partagée avant de se dupliquer :
+    les workers en héritent ; ailleurs (Streamlit, Windows) elle reste locale."""
+    global _queue
+    with _queue_lock:
+        if _queue is None or (shared and not _queue.shared):
+            _queue = AdmissionQueue(shared=shared)
+        return _queue
@@ -2,7 +2,23 @@ import psycopg2
 import bcrypt
 import os
 
+MIGRATION_FILE = "migrations/001_users_unique.sql"
+# Définitions d'index (pg_indexes) acceptées pour l'unicité de chaque colonne
+UNIQUE_INDEX_COLUMNS = {
+    "username": ("(username)",),
+    "email": ("(email)", "(lower(email))", "(lower((email)::text))"),
+}
+
+
+def normalize_email(email):
+    """Forme enregistrée d'un e-mail, identique pour l'inscription et la création en masse."""
+    return email.strip().lower()
+
+
 class AuthManager:
+    # Vérifié une fois par processus ; un résultat négatif est revérifié à chaque inscription
+    _unique_indexes = False
+
     def __init__(self):
         self.db_name = os.getenv("DB_NAME")
         self.db_user = os.getenv("DB_USER")
@@ -24,30 +40,55 @@ class AuthManager:
         except psycopg2.OperationalError:
             return None
 
+    def has_unique_constraints(self):
+        """Vrai si les index uniques sur username et email existent ; sans eux,
+        ON CONFLICT DO NOTHING n'empêcherait pas les comptes en double.
+        Ils sont créés par la migration MIGRATION_FILE, pas par l'application."""
+        if AuthManager._unique_indexes:
+            return True
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = 'users'")
+            definitions = [row[0] for row in cursor.fetchall() if "UNIQUE" in row[0]]
+            cursor.close()
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Impossible de vérifier les contraintes d'unicité sur users: {e}")
+            return False
+        AuthManager._unique_indexes = all(
+            any(d.endswith(suffix) for d in definitions for suffix in suffixes)
+            for suffixes in UNIQUE_INDEX_COLUMNS.values()
+        )
+        if not AuthManager._unique_indexes:
+            print(f"Contraintes d'unicité absentes sur users : appliquer {MIGRATION_FILE}")
+        return AuthManager._unique_indexes
+
     def register_user(self, username, email, password):
         if not self.conn:
             return False, "Erreur de connexion à la base de données."
+        if not self.has_unique_constraints():
+            return False, "Inscription momentanément indisponible. Contactez l'administrateur."
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                "SELECT username FROM users WHERE username = %s OR email = %s",
-                (username, email)
-            )
-            if cursor.fetchone():
-                cursor.close()
-                return False, "Le nom d'utilisateur ou l'email existe déjà."
-
+            email = normalize_email(email)
             hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
             hashed_password_str = hashed_password.decode('utf-8')  
+            cursor = self.conn.cursor()
+            # Un seul aller-retour atomique : l'unicité est garantie par les index uniques
             cursor.execute(
-                "INSERT INTO users (username, email, password_hash, role) VALUES (%s, %s, %s, %s)",
+                "INSERT INTO users (username, email, password_hash, role) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT DO NOTHING RETURNING username",
                 (username, email, hashed_password_str, "user")
             )
+            inserted = cursor.fetchone()
             self.conn.commit()
             cursor.close()
+            if not inserted:
+                return False, "Le nom d'utilisateur ou l'email existe déjà."
             return True, "Inscription réussie."
         except Exception as e:
+            self.conn.rollback()
             return False, f"Erreur: {e}"
 
     def login_user(self, username, password):
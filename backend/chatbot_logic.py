@@ -2,40 +2,36 @@ import os
 import pickle
 import asyncio
 import time
+import threading
+import uuid
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaLLM
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema.runnable import RunnablePassthrough
+from operator import itemgetter
+from langchain.schema.runnable import RunnableLambda
 from langchain.schema.output_parser import StrOutputParser
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from backend.llm_manager import get_llm_manager, DEFAULT_MODEL
+from backend.model_router import get_model_router
+from backend.corpus_watcher import CorpusWatcher
+from backend.admission import get_admission_queue
+from backend.retrieval_daemon import RetrievalClient, DaemonRetriever
+from backend.memory_stats import register_logic, deep_sizeof
+from backend.warmup import QueryLog, AnswerStore, WarmupRunner, QUERY_LOG_FILE, query_key
+from backend.sharded_index import ShardedIndex, ShardedRetriever, group_by_file
+from backend.document_catalog import DocumentCatalog
+from backend.degradation import ExtractiveAnswerer, get_degradation_policy
+from backend.dedup import ChunkDeduplicator, save_report, load_report
+from backend.embeddings import EMBEDDING_MODEL_PATH, get_embeddings
+from backend.index_builder import (
+    CHUNKS_FILE, CHUNK_SIZE, CHUNK_OVERLAP, load_and_split_pdf, read_manifest, verify,
+    compatibility_problems, reject
+)
+from backend.retrieval_cache import RetrievalCache
 
-class OptimizedChatbotLogic:
-    def __init__(self, pdf_folder, index_file="faiss_index"):
-        self.pdf_folder = pdf_folder
-        self.index_file = index_file
-        self.model_path = r"C:\Users\T.SHIGARAKI\.cache\huggingface\hub\models--sentence-transformers--all-MiniLM-L12-v2\snapshots\c004d8e3e901237d8fa7e9fff12774962e391ce5"
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.model_path,
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        self.llm = OllamaLLM(
-            model="gemma:2b", 
-            base_url="http://127.0.0.1:11434",
-            temperature=0.1,
-            num_ctx=1024,
-            num_thread=4,
-            num_gpu=0,
-            repeat_penalty=1.1,
-            top_k=10,
-            top_p=0.9
-        )
-        self.retriever = None
-        self.cache_responses = {}
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        self.system_prompt = """
+# Partie constante du prompt, placée en tête pour que le cache de prompt d'Ollama
+# réutilise son évaluation d'une requête à l'autre. Le contexte et la question,
+# qui changent à chaque requête, viennent toujours après.
+SYSTEM_PROMPT_PREFIX = """
 Tu es un assistant spécialisé. Réponds uniquement avec le contexte fourni.
 
 Règles :
@@ -44,23 +40,320 @@ Règles :
 - Français uniquement
 - Maximum 3 phrases concises
 
-Contexte: {context}
+"""
+
+# Nombre de chunks retrouvés et budget de contexte en caractères (voir retrieval_eval.py)
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", "1500"))
+
+
+def select_context(docs, max_context_length=CONTEXT_BUDGET):
+    """Extraits des documents qui tiennent dans le budget, le dernier éventuellement tronqué."""
+    selected = []
+    total_length = 0
+    
+    for doc in docs:
+        content = doc.page_content.strip()
+        if total_length + len(content) <= max_context_length:
+            selected.append((doc, content))
+            total_length += len(content)
+        else:
+            remaining = max_context_length - total_length
+            if remaining > 100:
+                selected.append((doc, content[:remaining] + "..."))
+            break
+    
+    return selected
+
+
+def format_context(docs, max_context_length=CONTEXT_BUDGET):
+    return "\n\n".join(text for _, text in select_context(docs, max_context_length))
+
+
+def _is_timeout(error):
+    """File d'admission saturée ou délai de lecture Ollama (httpx) dépassé."""
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+class HeadlessState(dict):
+    """Remplace st.session_state pour utiliser la logique hors de Streamlit."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+class OptimizedChatbotLogic:
+    def __init__(self, pdf_folder, index_file="faiss_index", query_log_file=QUERY_LOG_FILE,
+                 catalog_table="documents", retrieval_socket=None):
+        self.pdf_folder = pdf_folder
+        self.index_file = index_file
+        self.model_path = EMBEDDING_MODEL_PATH
+        self._embeddings = None
+        # Distingue deux instances successives d'un même corpus (après éviction puis rechargement)
+        self.instance_id = uuid.uuid4().hex
+        # Avec un démon de recherche, ce processus ne charge ni modèle d'embedding ni index
+        self.retrieval_client = None
+        if retrieval_socket is None:
+            retrieval_socket = os.getenv("RETRIEVAL_SOCKET")
+        if retrieval_socket:
+            client = RetrievalClient(retrieval_socket)
+            if client.available():
+                self.retrieval_client = client
+        self.model_name = DEFAULT_MODEL
+        self.llm_manager = get_llm_manager()
+        self.llm = self.llm_manager.get_llm(self.model_name)
+        self.router = get_model_router()
+        self.admission = get_admission_queue()
+        self.degradation = get_degradation_policy()
+        self.extractive = ExtractiveAnswerer(
+            lambda: self.embeddings if self.retrieval_client is None else None
+        )
+        self.retriever = None
+        self.index = ShardedIndex(
+            os.path.join(self.index_file, "shards"),
+            lambda: self.embeddings,
+            categories_file=os.path.join(self.pdf_folder, "categories.json")
+        )
+        self.catalog = DocumentCatalog(catalog_table)
+        self.index.on_built = self._record_indexed
+        self.deduplicator = ChunkDeduplicator()
+        # En-têtes et pieds de page retirés, par fichier (conservés entre deux redémarrages)
+        self.boilerplate = load_report(self.index_file).get("boilerplate", {})
+        self.texts = None
+        # Manifest de l'index préconstruit chargé, le cas échéant
+        self.manifest = None
+        self.watcher = None
+        # Incrémentée à chaque reconstruction des chunks ou de l'index : les sessions
+        # la comparent à la leur pour savoir si elles doivent se resynchroniser.
+        self.index_version = 0
+        self._stale_index = False
+        self._ingest_lock = threading.Lock()
+        # Réponses générées par question normalisée, partagées par toutes les sessions et
+        # valables pour une seule version d'index (vidées dès qu'elle change)
+        self.cache_responses = OrderedDict()
+        self._responses_version = None
+        self._responses_lock = threading.Lock()
+        # Chunks et contexte par question normalisée, et chaînes RAG compilées par
+        # niveau : les deux ne valent que pour la version d'index courante.
+        self.retrieval_cache = RetrievalCache()
+        self._chains = {}
+        self._chains_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.query_log = QueryLog(query_log_file)
+        self.answer_store = AnswerStore(self.index_file)
+        self.warmup = WarmupRunner(self, self.answer_store, self.query_log)
+        # Faux dans le processus principal de l'API : aucun thread avant le fork
+        self.background = True
+        register_logic(self)
+        self.system_prompt = SYSTEM_PROMPT_PREFIX + """Contexte: {context}
 Question: {question}
 Réponse:
 """
 
+    @property
+    def embeddings(self):
+        # Modèle partagé entre tous les corpus du processus
+        if self._embeddings is None:
+            self._embeddings = get_embeddings(self.model_path)
+        return self._embeddings
+
+    def session_key(self):
+        return self.instance_id, self.index_version
+
+    def needs_sync(self, st_session_state):
+        self._refresh_daemon_version()
+        return st_session_state.get("index_key") != self.session_key()
+
+    def ensure_ready(self, st_session_state):
+        """Synchronise la session avec les données partagées.
+
+        Le dossier n'est analysé qu'au premier appel du processus ; ensuite les
+        sessions comparent seulement leur clé (instance, `index_version`) à la leur,
+        la version étant incrémentée par le watcher après chaque ingestion. La session
+        ne garde que cette clé : chunks et retriever restent sur l'instance partagée.
+        """
+        if not self.needs_sync(st_session_state):
+            return False
+        with self._ingest_lock:
+            if self.retrieval_client is not None:
+                self._sync_daemon()
+            elif self.texts is None:
+                self.initialize(st_session_state)
+            st_session_state.index_key = self.session_key()
+        return True
+
+    def _sync_daemon(self):
+        self.retriever = DaemonRetriever(client=self.retrieval_client, k=RETRIEVAL_K)
+        self.index_version = self.retrieval_client.current_version(max_age=0)
+        self.texts = self.texts or []
+
+    def _refresh_daemon_version(self):
+        """En mode démon, suit la version de l'index du démon (réindexé hors de ce processus)."""
+        if self.retrieval_client is None or self.retriever is None:
+            return
+        try:
+            self.index_version = self.retrieval_client.current_version()
+        except (OSError, ValueError) as e:
+            print(f"Version de l'index du démon indisponible: {e}")
+
+    def initialize(self, st_session_state, watch=True):
+        """Charge l'index préconstruit s'il existe ; sinon construit chunks et index
+        dans ce processus et surveille le dossier des PDFs."""
+        if self.retrieval_client is not None:
+            self._sync_daemon()
+            return
+        if self.load_prebuilt(st_session_state):
+            return
+        self.prepare_data(st_session_state)
+        self.load_index(st_session_state)
+        if watch:
+            self.start_watcher()
+
+    def load_prebuilt(self, st_session_state):
+        """Charge l'artefact de `python -m backend.index_builder` après vérification
+        du modèle d'embedding et des empreintes. Le dossier n'est alors plus surveillé :
+        un nouveau document demande une nouvelle construction hors ligne."""
+        manifest = read_manifest(self.index_file)
+        if manifest is None:
+            return False
+        problems = compatibility_problems(manifest, self.model_path) or verify(self.index_file, manifest)
+        if problems:
+            print(f"Index préconstruit ignoré : {', '.join(problems)}")
+            # Reconstruit une fois ici ; l'artefact écarté n'est plus revérifié aux démarrages suivants
+            reject(self.index_file)
+            self._stale_index = True
+            return False
+
+        self.index.load()
+        with open(os.path.join(self.index_file, CHUNKS_FILE), "rb") as f:
+            self.texts = pickle.load(f)
+        self.retriever = ShardedRetriever(index=self.index, k=RETRIEVAL_K) if len(self.index) else None
+        self.manifest = manifest
+        self._stale_index = False
+        self.index_version += 1
+
+        if self.background:
+            self._sync_catalog()
+        self.schedule_warmup()
+        return True
+
+    def _sync_catalog(self):
+        """Reporte dans le catalogue les documents du manifest de l'index préconstruit.
+        Dans l'API, c'est fait après le fork (`start_background`) : le processus
+        principal n'ouvre aucune connexion à la base."""
+        if self.manifest is None:
+            return
+        fingerprint = self.index.fingerprint()
+        for doc in self.manifest["documents"]:
+            self.catalog.upsert(
+                doc["file"],
+                content_hash=doc["sha256"],
+                page_count=doc["pages"],
+                chunk_count=doc["chunks"],
+                index_version=fingerprint,
+                status="error" if doc["error"] else "indexed",
+                error=doc["error"]
+            )
+
+    def memory_footprint(self):
+        """Mémoire propre au corpus (vecteurs, docstore, chunks, cache), hors modèles partagés."""
+        return self.index.vector_bytes() + deep_sizeof(
+            (self.index.docstores(), self.texts or [], self.cache_responses, self.retrieval_cache._entries)
+        )
+
+    def close(self):
+        """Arrête les tâches de fond d'un corpus libéré ; la mémoire est rendue
+        dès que les requêtes en cours ne le référencent plus."""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.warmup.stop()
+        self.executor.shutdown(wait=False)
+
+    def start_watcher(self):
+        if self.watcher is None:
+            os.makedirs(self.pdf_folder, exist_ok=True)
+            self.watcher = CorpusWatcher(self.pdf_folder, self.ingest_changes)
+            self.watcher.start()
+
+    def _load_and_split(self, files):
+        documents = []
+        for file in files:
+            path = os.path.join(self.pdf_folder, file)
+            chunks, repeated, page_count, seconds, error = load_and_split_pdf(path)
+            if error:
+                print(f"Erreur lors du chargement de {file}: {error}")
+            if repeated:
+                self.boilerplate[file] = repeated
+            else:
+                self.boilerplate.pop(file, None)
+            documents.extend(chunks)
+            self.catalog.record_extraction(path, page_count, seconds, error=error)
+        return documents
+
+    def _indexable_by_file(self, texts):
+        """Chunks à indexer après déduplication, groupés par document."""
+        return group_by_file(self.deduplicator.deduplicate(texts))
+
+    def _save_dedup_report(self):
+        report = dict(self.deduplicator.last_report or {})
+        # Temps d'embedding évité, estimé avec le coût moyen par chunk des shards construits
+        metas = [meta for _, meta in self.index.shards.values() if meta.get("embedding_seconds")]
+        chunks = sum(meta["chunks"] for meta in metas)
+        if chunks and report:
+            per_chunk = sum(meta["embedding_seconds"] for meta in metas) / chunks
+            report["embedding_seconds_saved"] = per_chunk * (report["chunks_in"] - report["chunks_kept"])
+        report["boilerplate"] = {f: lines for f, lines in self.boilerplate.items() if os.path.exists(os.path.join(self.pdf_folder, f))}
+        try:
+            save_report(self.index_file, report)
+        except OSError as e:
+            print(f"Erreur écriture du rapport de déduplication: {e}")
+
+    def _record_indexed(self, filename, meta):
+        self.catalog.record_indexed(
+            filename,
+            meta["chunks"],
+            meta["embedding_seconds"],
+            self.index.fingerprint()
+        )
+
+    def _files_state(self, current_files):
+        """État qui valide le cache des chunks : dates des PDFs et paramètres de découpage."""
+        return {
+            "chunking": {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP},
+            "mtimes": {f: os.path.getmtime(os.path.join(self.pdf_folder, f)) for f in current_files},
+        }
+
+    def _save_texts_cache(self, current_files):
+        try:
+            with open(os.path.join(self.pdf_folder, "texts.pkl"), "wb") as f:
+                pickle.dump(self.texts, f)
+            with open(os.path.join(self.pdf_folder, "files_list.pkl"), "wb") as f:
+                pickle.dump(current_files, f)
+            
+            with open(os.path.join(self.pdf_folder, "files_modified.pkl"), "wb") as f:
+                pickle.dump(self._files_state(current_files), f)
+        except Exception as e:
+            print(f"Erreur de cache: {e}")
+
     def prepare_data(self, st_session_state):
         texts_file = os.path.join(self.pdf_folder, "texts.pkl")
         files_list_file = os.path.join(self.pdf_folder, "files_list.pkl")
         
         if not os.path.exists(self.pdf_folder):
-            st_session_state.texts = []
+            self.texts = []
+            self.retriever = None
             return
 
         current_files = [f for f in os.listdir(self.pdf_folder) if f.endswith(".pdf")]
         
         if not current_files:
-            st_session_state.texts = []
+            self.texts = []
+            self.retriever = None
             return
 
         if os.path.exists(texts_file) and os.path.exists(files_list_file):
@@ -68,9 +361,9 @@ Réponse:
                 with open(files_list_file, "rb") as f:
                     old_files = pickle.load(f)
                 
-                files_modified = {}
-                for file in current_files:
-                    files_modified[file] = os.path.getmtime(os.path.join(self.pdf_folder, file))
+                # Un changement de CHUNK_SIZE / CHUNK_OVERLAP invalide aussi le cache ;
+                # les nouveaux chunks changent alors la signature de chaque shard.
+                files_modified = self._files_state(current_files)
                 
                 cache_file = os.path.join(self.pdf_folder, "files_modified.pkl")
                 if os.path.exists(cache_file):
@@ -79,92 +372,123 @@ Réponse:
                     
                     if (set(current_files) == set(old_files) and 
                         files_modified == old_modified):
-                        with open(texts_file, "rb") as f:
-                            st_session_state.texts = pickle.load(f)
+                        if self.texts is None:
+                            with open(texts_file, "rb") as f:
+                                self.texts = pickle.load(f)
                         return
             except:
                 pass
 
-        documents = []
-        for file in current_files:
-            try:
-                loader = PyPDFLoader(os.path.join(self.pdf_folder, file))
-                docs = loader.load()
-                
-                for doc in docs:
-                    doc.page_content = " ".join(doc.page_content.split())
-                    
-                documents.extend(docs)
-            except Exception as e:
-                print(f"Erreur lors du chargement de {file}: {e}")
-
-        if not documents:
-            st_session_state.texts = []
+        self.texts = self._load_and_split(current_files)
+        if not self.texts:
+            self.retriever = None
             return
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=750,
-            chunk_overlap=150,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        st_session_state.texts = text_splitter.split_documents(documents)
+        self.retriever = None
+        self._stale_index = True
+        self.index_version += 1
+        self._save_texts_cache(current_files)
 
-        try:
-            with open(texts_file, "wb") as f:
-                pickle.dump(st_session_state.texts, f)
-            with open(files_list_file, "wb") as f:
-                pickle.dump(current_files, f)
-            
-            files_modified = {}
-            for file in current_files:
-                files_modified[file] = os.path.getmtime(os.path.join(self.pdf_folder, file))
-            
-            with open(os.path.join(self.pdf_folder, "files_modified.pkl"), "wb") as f:
-                pickle.dump(files_modified, f)
-        except Exception as e:
-            print(f"Erreur de cache: {e}")
+    def ingest_changes(self, changed_files):
+        """Ingestion incrémentale : seuls les PDFs modifiés sont relus, découpés et réindexés."""
+        changed_sources = {os.path.join(self.pdf_folder, f) for f in changed_files}
+        present = [f for f in changed_files if os.path.exists(os.path.join(self.pdf_folder, f))]
+        new_chunks = self._load_and_split(present)
+
+        with self._ingest_lock:
+            base_texts = self.texts or []
+
+        kept = [doc for doc in base_texts if doc.metadata.get("source") not in changed_sources]
+        texts = kept + new_chunks
+        by_file = self._indexable_by_file(texts)
+
+        # Shards des documents modifiés, plus ceux dont les doublons fusionnés ont changé
+        for filename in changed_files:
+            if filename not in by_file:
+                self.index.remove_shard(filename)
+            if filename not in present:
+                self.catalog.delete(filename)
+                self.boilerplate.pop(filename, None)
+        for filename, chunks in by_file.items():
+            if filename in changed_files or self.index.is_outdated(filename, chunks):
+                self.index.build_shard(filename, chunks)
+        self._save_dedup_report()
+
+        with self._ingest_lock:
+            self.texts = texts
+            self.retriever = ShardedRetriever(index=self.index, k=RETRIEVAL_K) if len(self.index) else None
+            self._stale_index = False
+            self.index_version += 1
+
+        self.schedule_warmup()
+        current_files = sorted(f for f in os.listdir(self.pdf_folder) if f.endswith(".pdf"))
+        self._save_texts_cache(current_files)
 
     def load_index(self, st_session_state):
-        if "retriever" in st_session_state and st_session_state.retriever:
-            self.retriever = st_session_state.retriever
+        if self.retriever is not None and not self._stale_index:
             return
 
-        if not hasattr(st_session_state, "texts") or not st_session_state.texts:
+        if not self.texts:
             self.retriever = None
-            st_session_state.retriever = None
             return
 
         try:
-            if os.path.exists(f"{self.index_file}.faiss"):
-                db = FAISS.load_local(
-                    self.index_file, 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                self.retriever = db.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 3}
-                )
-                st_session_state.retriever = self.retriever
-                return
-        except:
-            pass
-
-        try:
-            db = FAISS.from_documents(st_session_state.texts, self.embeddings)
-            db.save_local(self.index_file)
-            self.retriever = db.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 3}
-            )
-            st_session_state.retriever = self.retriever
+            by_file = self._indexable_by_file(self.texts)
+            if self._stale_index:
+                self.index.rebuild(by_file)
+            else:
+                covered = self.index.load()
+                for filename, chunks in by_file.items():
+                    if self.index.is_outdated(filename, chunks):
+                        self.index.build_shard(filename, chunks)
+                for filename in covered - set(by_file):
+                    self.index.remove_shard(filename)
+            self._save_dedup_report()
+            self.retriever = ShardedRetriever(index=self.index, k=RETRIEVAL_K)
+            self._stale_index = False
+            self.schedule_warmup()
         except Exception as e:
             print(f"Erreur création index: {e}")
             self.retriever = None
-            st_session_state.retriever = None
 
-    def create_rag_chain(self):
+    def index_fingerprint(self):
+        """Identifiant stable du contenu de l'index (change dès qu'un shard est remplacé)."""
+        if self.retrieval_client is not None:
+            # En mode démon, la version suivie est déjà l'empreinte de l'index du démon
+            return self.index_version or None
+        return self.index.fingerprint()
+
+    def schedule_warmup(self):
+        if self.background and len(self.index):
+            self.warmup.schedule(self.index_fingerprint())
+
+    def start_background(self):
+        """Autorise et lance les tâches de fond différées (catalogue, pré-calcul des réponses)."""
+        self.background = True
+        self.executor.submit(self._sync_catalog)
+        self.schedule_warmup()
+
+    def generate_answer(self, user_query, background=False):
+        """Génère une réponse complète, sans statut ni cache (utilisé pour le pré-calcul,
+        avec `background=True` : lève Preempted si des utilisateurs ont besoin du modèle)."""
+        tier = self.router.route(user_query)
+        rag_chain = self.rag_chain_for(tier)
+        if not rag_chain:
+            return None
+        return "".join(self._stream_answer(rag_chain, user_query, tier, background=background))
+
+    def rag_chain_for(self, tier):
+        """Chaîne RAG du niveau, compilée une seule fois par version d'index."""
+        if not self.retriever:
+            return None
+        with self._chains_lock:
+            if self._chains.get("version") != self.index_version:
+                self._chains = {"version": self.index_version}
+            if tier not in self._chains:
+                self._chains[tier] = self.create_rag_chain(self._llm_for_tier(tier))
+            return self._chains[tier]
+
+    def create_rag_chain(self, llm=None):
         if not self.retriever:
             return None
             
@@ -172,103 +496,238 @@ Réponse:
         
         chain = (
             {
-                "context": self.retriever | self._format_docs, 
-                "question": RunnablePassthrough()
+                "context": RunnableLambda(self._cached_context), 
+                "question": itemgetter("question")
             }
             | prompt
-            | self.llm
+            | (llm or self.llm)
             | StrOutputParser()
         )
         return chain
     
+    def retrieve(self, user_query, filters=None):
+        """Chunks et contexte formaté de la question, depuis le cache quand c'est possible.
+
+        `filters` (métadonnées des shards, ex. {"academic_year": "2024-2025"}) restreint
+        la recherche aux documents correspondants.
+        """
+        self._refresh_daemon_version()
+        # Version lue avant la recherche : un résultat obtenu pendant une
+        # réindexation est rangé sous l'ancienne version, donc jamais resservi.
+        version = self.index_version
+        entry = self.retrieval_cache.get(user_query, version, filters)
+        if entry is not None:
+            return entry
+        start_time = time.perf_counter()
+        retriever = self.retriever
+        if filters:
+            retriever = retriever.model_copy(update={"filters": dict(retriever.filters, **filters)})
+        docs = retriever.invoke(user_query)
+        if self.retrieval_client is not None:
+            # Version que le démon a réellement interrogée, renvoyée avec le résultat
+            version = self.index_version = self.retrieval_client.index_version
+        context = self._format_docs(docs)
+        return self.retrieval_cache.put(user_query, version, docs, context, time.perf_counter() - start_time, filters)
+
+    def _cached_context(self, inputs):
+        return self.retrieve(inputs["question"], inputs.get("filters"))["context"]
+
     def _format_docs(self, docs):
-        max_context_length = 1500
-        
-        formatted = []
-        total_length = 0
-        
-        for doc in docs:
-            content = doc.page_content.strip()
-            if total_length + len(content) <= max_context_length:
-                formatted.append(content)
-                total_length += len(content)
-            else:
-                remaining = max_context_length - total_length
-                if remaining > 100:
-                    formatted.append(content[:remaining] + "...")
-                break
-        
-        return "\n\n".join(formatted)
+        return format_context(docs)
+
+    def run_query_with_status(self, user_query, allow_fallback=True, filters=None, pace=True):
+        """Flux de (type, contenu) ; `filters` restreint la recherche (voir `retrieve`).
 
-    def run_query_with_status(self, user_query):
+        `pace` espace statuts et fragments rejoués pour l'affichage Streamlit ; l'API
+        (clients sans interface) le désactive.
+        """
+        pause = time.sleep if pace else (lambda seconds: None)
+        self.query_log.record(user_query)
         yield "status", "🔍 Recherche dans le cache..."
-        time.sleep(0.1)
+        pause(0.1)
         
-        if user_query in self.cache_responses:
+        cached = self._cached_response(user_query, filters)
+        if cached:
             yield "status", "✅ Réponse trouvée en cache !"
-            time.sleep(0.2)
+            pause(0.2)
             yield "status", "💬 Affichage de la réponse..."
             
-            cached = self.cache_responses[user_query]
             if isinstance(cached, list):
                 for chunk in cached:
                     yield "content", chunk
-                    time.sleep(0.05)
+                    pause(0.05)
             else:
                 words = cached.split()
                 for i, word in enumerate(words):
                     yield "content", word + " "
                     if i % 3 == 0:
-                        time.sleep(0.05)
+                        pause(0.05)
+            return
+
+        # Les réponses pré-calculées l'ont été sans filtre
+        precomputed = None if filters else self.answer_store.get(user_query, self.index_fingerprint())
+        if precomputed:
+            yield "status", "⚡ Réponse pré-calculée"
+            yield "content", precomputed
             return
 
         yield "status", "🔧 Initialisation du système de recherche..."
-        time.sleep(0.1)
+        pause(0.1)
         
-        rag_chain = self.create_rag_chain()
+        tier = self.router.route(user_query)
+        rag_chain = self.rag_chain_for(tier)
         if not rag_chain:
             yield "content", "❌ Aucun document disponible pour répondre à la requête."
             return
 
         try:
             yield "status", "📚 Recherche dans les documents..."
-            time.sleep(0.2)
+            pause(0.2)
+            
+            if allow_fallback and self.degradation.should_degrade(self.estimate_ttft(tier)):
+                # Modèle froid : on le recharge en arrière-plan pour les questions suivantes
+                self.llm_manager.warm_up_async(self.router.config(tier)["model"])
+                yield from self._extractive_answer(user_query, "estimated", filters)
+                return
             
-            yield "status", "🤖 Génération de la réponse par Gemma..."
-            time.sleep(0.1)
+            if tier == "fast":
+                yield "status", "⚡ Génération rapide de la réponse..."
+            else:
+                yield "status", "🤖 Génération de la réponse par Gemma..."
+            pause(0.1)
             
             yield "status", "💬 Affichage en temps réel..."
             
-            response_stream = rag_chain.stream(user_query)
             response_chunks = []
-            
-            for chunk in response_stream:
-                if chunk and chunk.strip():
-                    response_chunks.append(chunk)
-                    yield "content", chunk
+            slot_timeout = self.degradation.ttft_slo if allow_fallback else None
+            attempts = [tier] if tier == "full" else [tier, "full"]
+            try:
+                for attempt in attempts:
+                    try:
+                        if attempt != tier:
+                            rag_chain = self.rag_chain_for(attempt)
+                        for chunk in self._stream_answer(rag_chain, user_query, attempt, slot_timeout, filters=filters):
+                            response_chunks.append(chunk)
+                            yield "content", chunk
+                        break
+                    except Exception as e:
+                        # Le modèle rapide peut être absent d'Ollama : on bascule sur le modèle principal
+                        if _is_timeout(e) or attempt == "full" or response_chunks:
+                            raise
+                        self.router.record_fallback()
+            except Exception as e:
+                if not (allow_fallback and _is_timeout(e) and not response_chunks):
+                    raise
+                yield from self._extractive_answer(user_query, "timeout", filters)
+                return
+            self.degradation.record_generated()
             
             if response_chunks:
-                self.cache_responses[user_query] = response_chunks
-                
-                if len(self.cache_responses) > 50:
-                    oldest_keys = list(self.cache_responses.keys())[:10]
-                    for key in oldest_keys:
-                        del self.cache_responses[key]
+                self._store_response(user_query, response_chunks, filters)
                         
         except Exception as e:
             yield "status", "❌ Erreur lors du traitement..."
-            time.sleep(0.1)
+            pause(0.1)
             error_msg = f"Une erreur est survenue: {str(e)}"
             yield "content", error_msg
 
+    def _cached_response(self, user_query, filters=None):
+        self._refresh_daemon_version()
+        with self._responses_lock:
+            if self._responses_version != self.index_version:
+                self.cache_responses.clear()
+                self._responses_version = self.index_version
+            key = query_key(user_query, filters)
+            cached = self.cache_responses.get(key)
+            if cached is not None:
+                self.cache_responses.move_to_end(key)
+            return cached
+
+    def _store_response(self, user_query, response_chunks, filters=None, max_entries=50):
+        with self._responses_lock:
+            # Réponse générée sur un index remplacé entre-temps : pas gardée
+            if self._responses_version != self.index_version:
+                return
+            self.cache_responses[query_key(user_query, filters)] = response_chunks
+            while len(self.cache_responses) > max_entries:
+                self.cache_responses.popitem(last=False)
+
+    def _llm_for_tier(self, tier):
+        config = self.router.config(tier)
+        return self.llm_manager.get_llm(
+            config["model"],
+            num_predict=config["num_predict"],
+            stop=config["stop"]
+        )
+
+    def estimate_ttft(self, tier):
+        """Attente estimée avant le premier token : file d'admission puis premier token."""
+        model = self.router.config(tier)["model"]
+        llm_stats = self.llm_manager.stats()
+        if self.llm_manager.is_warm(model):
+            first_token = llm_stats["ttft_warm_avg"]
+        else:
+            first_token = llm_stats["ttft_cold_avg"] or llm_stats["load_durations"].get(model)
+        return self.degradation.estimate_ttft(
+            self.admission.stats(),
+            self.router.stats()["avg_latency"][tier],
+            first_token
+        )
+
+    def _extractive_answer(self, user_query, reason, filters=None):
+        """Réponse extractive immédiate, sans LLM ; non mise en cache pour permettre la version générée."""
+        start_time = time.time()
+        yield "status", "⚡ Forte affluence : réponse extraite des documents..."
+        docs = self.retrieve(user_query, filters)["docs"]
+        answer = self.extractive.answer(user_query, docs)
+        self.degradation.record_fallback(reason, time.time() - start_time)
+        if not answer:
+            yield "content", "question hors contexte"
+            return
+        yield "content", answer
+        yield "fallback", {"reason": reason, "upgrade": True}
+
+    def _stream_answer(self, rag_chain, user_query, tier, slot_timeout=None, background=False, filters=None):
+        """Diffuse la réponse et coupe la génération dès que le budget du niveau est atteint.
+
+        En arrière-plan (pré-calcul), la génération n'occupe la place que si personne
+        n'attend, s'interrompt (Preempted) dès qu'un utilisateur arrive et n'entre pas
+        dans les mesures de premier token ni dans les statistiques du routeur.
+        """
+        model = self.router.config(tier)["model"]
+        cold = not self.llm_manager.is_warm(model)
+        start_time = time.time()
+        answer = ""
+        slot = self.admission.background_slot() if background else self.admission.slot(timeout=slot_timeout)
+        with slot:
+            response_stream = rag_chain.stream({"question": user_query, "filters": filters})
+            try:
+                for chunk in response_stream:
+                    if background:
+                        self.admission.yield_if_needed()
+                    if chunk and chunk.strip():
+                        if not answer and not background:
+                            self.llm_manager.record_first_token(model, time.time() - start_time, cold)
+                        answer += chunk
+                        yield chunk
+                        if self.router.budget_reached(tier, answer):
+                            break
+            finally:
+                response_stream.close()
+        self.llm_manager.mark_used(model)
+        if not background:
+            self.router.record(tier, time.time() - start_time)
+
     def run_query(self, user_query):
         for msg_type, content in self.run_query_with_status(user_query):
             if msg_type == "content":
                 yield content
 
     def preload_model(self):
-        try:
-            dummy_query = "test"
-            list(self.llm.stream(dummy_query))
-        except:
-            pass
\ No newline at end of file
+        """Préchauffe le modèle une seule fois par processus (aucun token généré)."""
+        return self.llm_manager.warm_up(self.model_name)
+
+    def preload_embeddings(self):
+        """Charge le modèle d'embedding de ce processus (aucun en mode démon)."""
+        if self.retrieval_client is None:
+            return self.embeddings
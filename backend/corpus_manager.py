@@ -0,0 +1,210 @@
+"""
+Plusieurs corpus (une faculté = un dossier de PDFs et son index) servis par un même
+processus. Chaque corpus est chargé à sa première utilisation puis gardé en mémoire
+tant que le budget global le permet ; au-delà, les corpus les moins récemment
+utilisés sont libérés. Le modèle d'embedding et le LLM sont partagés.
+
+Les corpus sont décrits dans corpora.json (sans ce fichier, seul le corpus
+historique pdfs/ + faiss_index/ est servi) :
+
+    {
+      "default": "fs",
+      "corpora": {
+        "fs": {"name": "Faculté des Sciences", "pdf_folder": "pdfs", "index_dir": "faiss_index"},
+        "fl": {"name": "Faculté des Lettres", "pdf_folder": "corpora/fl/pdfs",
+               "index_dir": "corpora/fl/faiss_index"}
+      }
+    }
+
+Chaque index peut être construit hors ligne avec son propre manifest :
+`python -m backend.index_builder --corpus fl`.
+"""
+import gc
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from backend.chatbot_logic import OptimizedChatbotLogic, HeadlessState
+from backend.memory_stats import format_bytes
+from backend.warmup import QUERY_LOG_FILE
+
+CORPORA_FILE = os.getenv("CORPORA_FILE", "corpora.json")
+# Mémoire maximale occupée par les corpus chargés (vecteurs, docstore, chunks, cache)
+MEMORY_BUDGET = int(float(os.getenv("CORPUS_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024)
+DEFAULT_CORPUS_ID = "fs"
+DEFAULT_CORPUS = {"name": "Faculté des Sciences", "pdf_folder": "pdfs", "index_dir": "faiss_index"}
+CORPUS_ID_PATTERN = re.compile(r"^[a-z0-9_]{1,32}$")
+
+
+def load_corpora(path=CORPORA_FILE):
+    """Retourne (identifiant par défaut, {identifiant: configuration})."""
+    if not os.path.exists(path):
+        return DEFAULT_CORPUS_ID, {DEFAULT_CORPUS_ID: dict(DEFAULT_CORPUS)}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Erreur de lecture de {path}: {e}")
+        return DEFAULT_CORPUS_ID, {DEFAULT_CORPUS_ID: dict(DEFAULT_CORPUS)}
+
+    corpora = {}
+    for corpus_id, config in data.get("corpora", {}).items():
+        if not CORPUS_ID_PATTERN.match(corpus_id) or "pdf_folder" not in config:
+            print(f"Corpus ignoré (identifiant ou pdf_folder invalide) : {corpus_id}")
+            continue
+        corpora[corpus_id] = dict(
+            config,
+            name=config.get("name", corpus_id),
+            index_dir=config.get("index_dir", os.path.join(config["pdf_folder"], "faiss_index"))
+        )
+    if not corpora:
+        return DEFAULT_CORPUS_ID, {DEFAULT_CORPUS_ID: dict(DEFAULT_CORPUS)}
+    default = data.get("default")
+    return (default if default in corpora else next(iter(corpora))), corpora
+
+
+def corpus_options(corpus_id, config, is_default):
+    """Journal, table du catalogue et démon de recherche propres à un corpus ;
+    le corpus par défaut garde ceux d'avant le multi-corpus."""
+    return {
+        "query_log_file": config.get(
+            "query_log", QUERY_LOG_FILE if is_default else os.path.join(config["index_dir"], "query_log.jsonl")
+        ),
+        "catalog_table": config.get("catalog_table", "documents" if is_default else f"documents_{corpus_id}"),
+        "retrieval_socket": config.get("retrieval_socket", None if is_default else ""),
+    }
+
+
+class CorpusManager:
+    """Cache LRU des logiques de corpus, borné par un budget mémoire."""
+
+    def __init__(self, corpora=None, default=None, memory_budget=MEMORY_BUDGET, watch=True, background=True):
+        if corpora is None:
+            default, corpora = load_corpora()
+        self.corpora = corpora
+        self.default = default if default in corpora else next(iter(corpora))
+        self.memory_budget = memory_budget
+        self.watch = watch
+        self.background = background
+        self._loaded = OrderedDict()      # identifiant -> logique, du moins au plus récent
+        self._footprints = {}             # identifiant -> (clé de version, octets)
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0, "load_seconds": 0.0}
+
+    def resolve(self, corpus_id=None):
+        """Identifiant valide : celui demandé s'il existe, sinon le corpus par défaut."""
+        return corpus_id if corpus_id in self.corpora else self.default
+
+    def is_loaded(self, corpus_id):
+        return self.resolve(corpus_id) in self._loaded
+
+    def _create(self, corpus_id):
+        config = self.corpora[corpus_id]
+        logic = OptimizedChatbotLogic(
+            config["pdf_folder"],
+            config["index_dir"],
+            **corpus_options(corpus_id, config, corpus_id == self.default)
+        )
+        logic.background = self.background
+        return logic
+
+    def start_background(self):
+        """Lance les tâches de fond des corpus chargés et des suivants."""
+        self.background = True
+        with self._lock:
+            loaded = list(self._loaded.values())
+        for logic in loaded:
+            logic.start_background()
+
+    def get(self, corpus_id=None):
+        """Logique prête à répondre pour ce corpus, chargée à la première demande."""
+        if corpus_id is None:
+            corpus_id = self.default
+        if corpus_id not in self.corpora:
+            raise KeyError(corpus_id)
+
+        with self._lock:
+            logic = self._loaded.get(corpus_id)
+            if logic is not None:
+                self._loaded.move_to_end(corpus_id)
+                self._stats["hits"] += 1
+                return logic
+            load_lock = self._load_locks.setdefault(corpus_id, threading.Lock())
+
+        # Un seul chargement par corpus, sans bloquer les autres corpus pendant ce temps
+        with load_lock:
+            with self._lock:
+                logic = self._loaded.get(corpus_id)
+                if logic is not None:
+                    self._loaded.move_to_end(corpus_id)
+                    return logic
+            start = time.perf_counter()
+            logic = self._create(corpus_id)
+            logic.initialize(HeadlessState(), watch=self.watch)
+            with self._lock:
+                self._loaded[corpus_id] = logic
+                self._stats["loads"] += 1
+                self._stats["load_seconds"] += time.perf_counter() - start
+        self.enforce_budget(keep=corpus_id)
+        return logic
+
+    def footprint(self, corpus_id, logic=None):
+        """Mémoire du corpus, remesurée seulement quand son index a changé.
+        À appeler hors du verrou : la mesure parcourt tout le docstore."""
+        logic = logic or self._loaded.get(corpus_id)
+        if logic is None:
+            return 0
+        key = (logic.session_key(), len(logic.cache_responses) // 100)
+        cached = self._footprints.get(corpus_id)
+        if cached is None or cached[0] != key:
+            cached = (key, logic.memory_footprint())
+            self._footprints[corpus_id] = cached
+        return cached[1]
+
+    def enforce_budget(self, keep=None):
+        """Libère les corpus les moins récemment utilisés jusqu'à respecter le budget."""
+        with self._lock:
+            loaded = list(self._loaded.items())
+        # Mesure hors du verrou : get() ne doit pas attendre le parcours des docstores
+        sizes = {corpus_id: self.footprint(corpus_id, logic) for corpus_id, logic in loaded}
+        evicted = []
+        with self._lock:
+            total = sum(sizes.get(corpus_id, 0) for corpus_id in self._loaded)
+            for corpus_id in list(self._loaded):
+                if total <= self.memory_budget:
+                    break
+                if corpus_id == keep or corpus_id not in sizes:
+                    continue
+                total -= sizes[corpus_id]
+                evicted.append(self._loaded.pop(corpus_id))
+                self._footprints.pop(corpus_id, None)
+                self._stats["evictions"] += 1
+        for logic in evicted:
+            logic.close()
+        if evicted:
+            gc.collect()
+        return len(evicted)
+
+    def stats(self):
+        with self._lock:
+            loaded = list(reversed(self._loaded.items()))
+            counters = dict(self._stats)
+        rows = []
+        for corpus_id, logic in loaded:
+            memory = self.footprint(corpus_id, logic)
+            rows.append({
+                "corpus": corpus_id,
+                "name": self.corpora[corpus_id]["name"],
+                "memory": memory,
+                "memory_human": format_bytes(memory),
+            })
+        return dict(
+            counters,
+            corpora=len(self.corpora),
+            loaded=rows,
+            memory_used=sum(entry["memory"] for entry in rows),
+            memory_budget=self.memory_budget,
+        )
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+
+class CorpusWatcher:
+    """Surveille le dossier des PDFs (inotify via watchdog, sinon scrutation périodique),
+    regroupe les rafales de modifications et notifie les fichiers changés."""
+
+    def __init__(self, folder, on_change, debounce=2.0, poll_interval=30.0):
+        self.folder = folder
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.mode = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._observer = None
+        self._stop = threading.Event()
+        self._snapshot = {}
+
+    def start(self):
+        if self.mode:
+            return
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import (
+                FileSystemEventHandler, EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED,
+                EVENT_TYPE_DELETED, EVENT_TYPE_MOVED
+            )
+
+            watcher = self
+            # Les ouvertures et fermetures sans écriture sont ignorées : l'ingestion
+            # relit elle-même les PDFs et se redéclencherait sans fin.
+            changes = {EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED, EVENT_TYPE_DELETED, EVENT_TYPE_MOVED}
+
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    if event.is_directory or event.event_type not in changes:
+                        return
+                    for path in (event.src_path, getattr(event, "dest_path", "")):
+                        if path:
+                            watcher.notify(os.path.basename(os.fsdecode(path)))
+
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), self.folder, recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+            self.mode = "inotify"
+        except Exception as e:
+            print(f"Surveillance inotify indisponible, scrutation périodique: {e}")
+            self._snapshot = self.scan()
+            threading.Thread(target=self._poll_loop, name="corpus-poller", daemon=True).start()
+            self.mode = "polling"
+
+    def stop(self):
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+
+    def scan(self):
+        if not os.path.exists(self.folder):
+            return {}
+        return {
+            entry.name: entry.stat().st_mtime
+            for entry in os.scandir(self.folder)
+            if entry.is_file() and entry.name.endswith(".pdf")
+        }
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            current = self.scan()
+            changed = {
+                name for name in set(current) | set(self._snapshot)
+                if current.get(name) != self._snapshot.get(name)
+            }
+            self._snapshot = current
+            for name in changed:
+                self.notify(name)
+
+    def notify(self, filename):
+        """Enregistre un fichier modifié et relance le délai d'attente (debounce)."""
+        if not filename.endswith(".pdf"):
+            return
+        with self._lock:
+            self._pending.add(filename)
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            changed = self._pending
+            self._pending = set()
+            self._timer = None
+        if not changed:
+            return
+        with self._flush_lock:
+            self.version += 1
+            start = time.time()
+            try:
+                self.on_change(sorted(changed))
+            except Exception as e:
+                print(f"Erreur d'ingestion incrémentale: {e}")
+            print(f"Corpus v{self.version}: {len(changed)} fichier(s) réindexé(s) en {time.time() - start:.1f} s")
@@ -0,0 +1,223 @@
+"""
+Déduplication à l'ingestion : les en-têtes et pieds de page répétés d'une page à
+l'autre sont retirés avant le découpage, puis les chunks identiques ou quasi
+identiques (MinHash + LSH) sont regroupés en un seul chunk indexé qui garde la
+liste de toutes ses sources.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import Counter
+import numpy as np
+from langchain_core.documents import Document
+from backend.sharded_index import detect_academic_year
+
+# Similarité de Jaccard estimée à partir de laquelle deux chunks sont fusionnés
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+NUM_PERM = 128
+# 32 bandes de 4 lignes : deux chunks deviennent candidats dès ~0,42 de similarité,
+# le seuil final est vérifié sur la signature complète.
+BANDS = 32
+SHINGLE_SIZE = 5
+MERSENNE = (1 << 31) - 1
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+REPORT_FILE = "dedup_report.json"
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+def _line_key(line):
+    # Les numéros de page ou de version ne doivent pas empêcher de reconnaître la ligne
+    return re.sub(r"\d+", "#", _normalize(line))
+
+
+def _numbers(text):
+    """Nombres d'un texte (montants, dates, articles) : deux versions d'un même
+    paragraphe qui ne diffèrent que par un chiffre ne sont pas des doublons."""
+    return tuple(sorted(NUMBER_PATTERN.findall(text)))
+
+
+def _recency(source):
+    """Clé de fraîcheur d'un document : année académique du nom. Jamais la date de
+    modification, pour que deux constructions des mêmes fichiers donnent le même index."""
+    year = detect_academic_year(os.path.basename(source)) or "0"
+    return int(year[:4])
+
+
+def strip_repeated_lines(pages, edge_lines=2, min_ratio=0.5, min_pages=3):
+    """Retire des pages d'un même PDF les lignes répétées en tête ou en pied de page.
+
+    Retourne les lignes retirées (forme normalisée, chiffres remplacés par #).
+    """
+    if len(pages) < min_pages:
+        return []
+
+    def edges(lines):
+        return set(range(min(edge_lines, len(lines)))) | set(range(max(len(lines) - edge_lines, 0), len(lines)))
+
+    page_lines = [[l for l in page.page_content.splitlines() if l.strip()] for page in pages]
+    counts = Counter()
+    for lines in page_lines:
+        counts.update({_line_key(lines[i]) for i in edges(lines)})
+    threshold = max(min_pages, min_ratio * len(pages))
+    repeated = {key for key, count in counts.items() if key and count >= threshold}
+    if not repeated:
+        return []
+
+    for page, lines in zip(pages, page_lines):
+        drop = {i for i in edges(lines) if _line_key(lines[i]) in repeated}
+        page.page_content = "\n".join(l for i, l in enumerate(lines) if i not in drop)
+    return sorted(repeated)
+
+
+class ChunkDeduplicator:
+    """Regroupe les chunks en double ; celui de la version la plus récente du document
+    (année académique, puis date de modification) est conservé."""
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=1):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE, size=num_perm).astype(np.uint64)
+        # Signatures de la dernière passe, par empreinte du texte normalisé
+        self._signatures = {}
+        self.last_report = None
+
+    def signature(self, text):
+        """Signature MinHash des 5-grammes de mots du texte normalisé."""
+        words = text.split()
+        shingles = {
+            " ".join(words[i:i + SHINGLE_SIZE])
+            for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+        }
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) % MERSENNE for s in shingles], dtype=np.uint64)
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE).min(axis=1)
+
+    def deduplicate(self, chunks):
+        """Retourne les chunks à indexer ; les doublons fusionnés listent leurs sources
+        dans `metadata["sources"]`. Le rapport est disponible dans `last_report`."""
+        start = time.perf_counter()
+        recency = {}
+        for chunk in chunks:
+            source = chunk.metadata.get("source", "")
+            if source not in recency:
+                recency[source] = _recency(source)
+        # Le premier chunk rencontré d'un groupe le représente : versions récentes d'abord,
+        # puis, à année égale, ordre des noms de fichier (indépendant des dates sur disque)
+        order = sorted(
+            range(len(chunks)),
+            key=lambda i: (
+                -recency[chunks[i].metadata.get("source", "")],
+                os.path.basename(chunks[i].metadata.get("source", "")),
+                chunks[i].metadata.get("page", 0),
+                i,
+            )
+        )
+        groups = []          # [indices], le premier est le représentant
+        exact = {}           # texte normalisé -> groupe
+        buckets = {}         # (bande, valeurs) -> groupes candidats
+        exact_count = near_count = 0
+        signatures = {}
+        numbers = {}         # groupe -> nombres du représentant
+        # Seules les signatures des chunks encore présents sont gardées pour la prochaine passe
+        previous, self._signatures = self._signatures, {}
+
+        for i in order:
+            text = _normalize(chunks[i].page_content)
+            if text in exact:
+                groups[exact[text]].append(i)
+                exact_count += 1
+                continue
+
+            key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            signature = previous.get(key)
+            if signature is None:
+                signature = self.signature(text)
+            self._signatures[key] = signature
+            bands = [(b, signature[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+            text_numbers = _numbers(text)
+            match = None
+            for band in bands:
+                for group in buckets.get(band, ()):
+                    if (numbers[group] == text_numbers
+                            and np.mean(signatures[group] == signature) >= self.threshold):
+                        match = group
+                        break
+                if match is not None:
+                    break
+            if match is not None:
+                groups[match].append(i)
+                near_count += 1
+                continue
+
+            group = len(groups)
+            groups.append([i])
+            exact[text] = group
+            signatures[group] = signature
+            numbers[group] = text_numbers
+            for band in bands:
+                buckets.setdefault(band, []).append(group)
+
+        kept, report_groups = [], []
+        for members in groups:
+            representative = chunks[members[0]]
+            if len(members) == 1:
+                kept.append(representative)
+                continue
+            sources = []
+            for i in members:
+                ref = {
+                    "source": os.path.basename(chunks[i].metadata.get("source", "inconnu")),
+                    "page": chunks[i].metadata.get("page"),
+                }
+                if ref not in sources:
+                    sources.append(ref)
+            kept.append(Document(
+                page_content=representative.page_content,
+                metadata=dict(representative.metadata, sources=sources, duplicates=len(members) - 1)
+            ))
+            report_groups.append({
+                "text": representative.page_content[:160],
+                "count": len(members),
+                "sources": sources,
+            })
+
+        chars_in = sum(len(c.page_content) for c in chunks)
+        chars_kept = sum(len(c.page_content) for c in kept)
+        report_groups.sort(key=lambda g: g["count"], reverse=True)
+        self.last_report = {
+            "chunks_in": len(chunks),
+            "chunks_kept": len(kept),
+            "exact_duplicates": exact_count,
+            "near_duplicates": near_count,
+            "chars_removed": chars_in - chars_kept,
+            "removed_ratio": 1 - len(kept) / len(chunks) if chunks else 0.0,
+            "threshold": self.threshold,
+            "seconds": time.perf_counter() - start,
+            "built_at": time.time(),
+            "groups": report_groups[:50],
+        }
+        return kept
+
+
+def save_report(index_dir, report):
+    os.makedirs(index_dir, exist_ok=True)
+    tmp = os.path.join(index_dir, REPORT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(index_dir, REPORT_FILE))
+
+
+def load_report(index_dir):
+    try:
+        with open(os.path.join(index_dir, REPORT_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
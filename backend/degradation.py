@@ -0,0 +1,122 @@
+"""
+Mode dégradé en cas de surcharge d'Ollama : si l'attente estimée avant le premier
+token dépasse le SLO, on répond de façon extractive (phrases les plus proches de la
+question dans les chunks retrouvés, avec la page source) au lieu de générer.
+"""
+import math
+import os
+import re
+import threading
+import numpy as np
+
+# Délai maximal acceptable avant le premier token (secondes)
+TTFT_SLO = float(os.getenv("LLM_TTFT_SLO", "8"))
+# Durée de génération supposée tant qu'aucune mesure n'est disponible
+DEFAULT_GENERATION_TIME = float(os.getenv("LLM_DEFAULT_GENERATION_TIME", "10"))
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+")
+WORD = re.compile(r"\w{3,}")
+
+
+class ExtractiveAnswerer:
+    """Sélectionne les phrases des chunks les plus similaires à la question."""
+
+    def __init__(self, embeddings_provider=None, max_sentences=2):
+        self._embeddings_provider = embeddings_provider
+        self.max_sentences = max_sentences
+
+    def _score(self, query, sentences):
+        embeddings = self._embeddings_provider() if self._embeddings_provider else None
+        if embeddings is not None:
+            vectors = np.asarray(embeddings.embed_documents([query] + sentences), dtype=np.float32)
+            return vectors[1:] @ vectors[0]
+        # Sans modèle local (client du démon de recherche) : recouvrement lexical
+        query_words = set(WORD.findall(query.lower()))
+        return [
+            len(query_words & set(WORD.findall(sentence.lower()))) / math.sqrt(len(sentence) + 1)
+            for sentence in sentences
+        ]
+
+    def answer(self, query, docs):
+        candidates = []
+        for doc in docs:
+            for sentence in SENTENCE_SPLIT.split(doc.page_content):
+                sentence = sentence.strip()
+                if 30 <= len(sentence) <= 400:
+                    candidates.append((sentence, doc))
+        if not candidates:
+            return None
+
+        scores = self._score(query, [sentence for sentence, _ in candidates])
+        best = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:self.max_sentences]
+
+        sentences, sources = [], []
+        for i in sorted(best):
+            sentence, doc = candidates[i]
+            sentences.append(sentence)
+            # Un chunk fusionné par la déduplication cite toutes ses sources
+            refs = doc.metadata.get("sources") or [doc.metadata]
+            for ref in refs:
+                source = os.path.basename(ref.get("source", "document"))
+                page = ref.get("page")
+                citation = f"{source}, p. {page + 1}" if isinstance(page, int) else source
+                if citation not in sources:
+                    sources.append(citation)
+        return " ".join(sentences) + "\n\n📄 Source : " + " ; ".join(sources)
+
+
+class DegradationPolicy:
+    """Décide du passage en mode extractif et mesure taux et latence de repli."""
+
+    def __init__(self, ttft_slo=TTFT_SLO):
+        self.ttft_slo = ttft_slo
+        self._lock = threading.Lock()
+        self._decisions = {"generated": 0, "extractive": 0}
+        self._reasons = {}
+        self._latencies = []
+
+    def estimate_ttft(self, admission_stats, generation_time, first_token_time):
+        """Attente estimée : générations devant nous dans la file, puis premier token."""
+        slots = admission_stats["max_concurrent"]
+        ahead = admission_stats["waiting"] + admission_stats["active"] - slots + 1
+        queue_wait = math.ceil(max(ahead, 0) / slots) * (generation_time or DEFAULT_GENERATION_TIME)
+        return queue_wait + (first_token_time or 0.0)
+
+    def should_degrade(self, estimated_ttft):
+        return estimated_ttft > self.ttft_slo
+
+    def record_generated(self):
+        with self._lock:
+            self._decisions["generated"] += 1
+
+    def record_fallback(self, reason, latency):
+        with self._lock:
+            self._decisions["extractive"] += 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+            self._latencies.append(latency)
+            del self._latencies[:-200]
+
+    def stats(self):
+        with self._lock:
+            total = sum(self._decisions.values())
+            return {
+                "ttft_slo": self.ttft_slo,
+                "generated": self._decisions["generated"],
+                "extractive": self._decisions["extractive"],
+                "fallback_rate": self._decisions["extractive"] / total if total else 0.0,
+                "reasons": dict(self._reasons),
+                "avg_fallback_latency": sum(self._latencies) / len(self._latencies) if self._latencies else None,
+            }
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_degradation_policy():
+    """Politique unique par processus, pour agréger les statistiques de toutes les sessions."""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = DegradationPolicy()
+        return _policy
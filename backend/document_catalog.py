@@ -0,0 +1,202 @@
+import hashlib
+import os
+import threading
+from datetime import datetime
+import psycopg2
+import psycopg2.extras
+
+SORTABLE_COLUMNS = {
+    "name", "size_bytes", "page_count", "chunk_count", "extraction_seconds",
+    "embedding_seconds", "status", "modified_at", "ingested_at",
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentCatalog:
+    """Catalogue des documents (table `documents` par défaut) tenu à jour par l'ingestion."""
+
+    def __init__(self, table="documents"):
+        # Une table par corpus (identifiant déjà validé par le gestionnaire de corpus)
+        self.table = table
+        self.db_name = os.getenv("DB_NAME")
+        self.db_user = os.getenv("DB_USER")
+        self.db_password = os.getenv("DB_PASSWORD")
+        self.db_host = os.getenv("DB_HOST")
+        self.db_port = os.getenv("DB_PORT")
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    @property
+    def conn(self):
+        """Connexion du processus courant, ouverte au premier usage : un catalogue créé
+        avant un fork (API multi-workers) n'en partage jamais une avec ses enfants."""
+        if self._conn_pid != os.getpid():
+            with self._connect_lock:
+                if self._conn_pid != os.getpid():
+                    self._conn = self._connect()
+                    self._conn_pid = os.getpid()
+                    if self._conn and not self._ensure_schema():
+                        # Catalogue facultatif : sans table utilisable, le chatbot fonctionne sans lui
+                        self._conn.close()
+                        self._conn = None
+        return self._conn
+
+    def _connect(self):
+        try:
+            conn = psycopg2.connect(
+                dbname=self.db_name,
+                user=self.db_user,
+                password=self.db_password,
+                host=self.db_host,
+                port=self.db_port
+            )
+            conn.autocommit = True
+            return conn
+        except psycopg2.Error:
+            return None
+
+    def _ensure_schema(self):
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        name TEXT PRIMARY KEY,
+                        content_hash TEXT,
+                        size_bytes BIGINT,
+                        page_count INTEGER,
+                        chunk_count INTEGER,
+                        extraction_seconds DOUBLE PRECISION,
+                        embedding_seconds DOUBLE PRECISION,
+                        index_version TEXT,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        error TEXT,
+                        modified_at TIMESTAMP,
+                        ingested_at TIMESTAMP
+                    )
+                """)
+            return True
+        except Exception as e:
+            create_error = e
+        # Sans droit CREATE, une table créée par un administrateur reste utilisable
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute(f"SELECT name FROM {self.table} LIMIT 0")
+            return True
+        except Exception:
+            print(f"Catalogue des documents indisponible ({self.table}): {create_error}")
+            return False
+
+    @property
+    def available(self):
+        return self.conn is not None
+
+    def upsert(self, name, **fields):
+        """Crée ou met à jour la ligne d'un document avec les colonnes fournies."""
+        if not self.conn:
+            return False
+        columns = ["name"] + list(fields)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in fields) or "name = EXCLUDED.name"
+        try:
+            with self._lock, self.conn.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                    f"ON CONFLICT (name) DO UPDATE SET {updates}",
+                    [name] + list(fields.values())
+                )
+            return True
+        except Exception as e:
+            print(f"Erreur catalogue ({name}): {e}")
+            return False
+
+    def register_file(self, path, status="pending"):
+        """Enregistre un fichier déposé, avant même son ingestion."""
+        stat = os.stat(path)
+        return self.upsert(
+            os.path.basename(path),
+            content_hash=file_hash(path),
+            size_bytes=stat.st_size,
+            modified_at=datetime.fromtimestamp(stat.st_mtime),
+            status=status,
+            error=None
+        )
+
+    def record_extraction(self, path, page_count, extraction_seconds, error=None):
+        fields = {"page_count": page_count, "extraction_seconds": extraction_seconds, "error": error}
+        if error:
+            fields["status"] = "error"
+        elif not page_count:
+            fields["status"] = "empty"
+        else:
+            fields["status"] = "extracted"
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fields.update(
+                content_hash=file_hash(path),
+                size_bytes=stat.st_size,
+                modified_at=datetime.fromtimestamp(stat.st_mtime)
+            )
+        return self.upsert(os.path.basename(path), **fields)
+
+    def record_indexed(self, name, chunk_count, embedding_seconds, index_version):
+        return self.upsert(
+            name,
+            chunk_count=chunk_count,
+            embedding_seconds=embedding_seconds,
+            index_version=index_version,
+            status="indexed",
+            ingested_at=datetime.now()
+        )
+
+    def delete(self, name):
+        if not self.conn:
+            return False
+        try:
+            with self._lock, self.conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table} WHERE name = %s", (name,))
+            return True
+        except Exception as e:
+            print(f"Erreur catalogue ({name}): {e}")
+            return False
+
+    def count(self):
+        if not self.conn:
+            return 0
+        try:
+            with self._lock, self.conn.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {self.table}")
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Erreur catalogue: {e}")
+            return 0
+
+    def list(self, page=1, per_page=20, sort_by="name", descending=False):
+        """Une page du catalogue, triée sur une colonne autorisée."""
+        if not self.conn:
+            return []
+        if sort_by not in SORTABLE_COLUMNS:
+            sort_by = "name"
+        order = "DESC NULLS LAST" if descending else "ASC NULLS LAST"
+        try:
+            with self._lock, self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    f"SELECT * FROM {self.table} ORDER BY {sort_by} {order}, name LIMIT %s OFFSET %s",
+                    (per_page, (max(page, 1) - 1) * per_page)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Erreur catalogue: {e}")
+            return []
+
+    def __del__(self):
+        # Seule la connexion ouverte par ce processus est fermée (jamais celle du parent)
+        if getattr(self, "_conn", None) and self._conn_pid == os.getpid():
+            self._conn.close()
@@ -0,0 +1,82 @@
+"""
+Modèle d'embedding partagé : un seul chargement par processus et par modèle,
+quel que soit le nombre de corpus servis. HashingEmbeddings fournit en plus un
+embedding déterministe sans modèle, pour les évaluations hors ligne.
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_MODEL_PATH = os.getenv(
+    "EMBEDDING_MODEL_PATH",
+    r"C:\Users\T.SHIGARAKI\.cache\huggingface\hub\models--sentence-transformers--all-MiniLM-L12-v2\snapshots\c004d8e3e901237d8fa7e9fff12774962e391ce5"
+)
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def embedding_model_id(model_path):
+    """« organisation/modèle@révision » pour un chemin du cache Hugging Face, sinon le chemin."""
+    parts = re.split(r"[\\/]", model_path.rstrip("\\/"))
+    for i, part in enumerate(parts):
+        if part.startswith("models--"):
+            name = part[len("models--"):].replace("--", "/")
+            if i + 2 < len(parts) and parts[i + 1] == "snapshots":
+                return f"{name}@{parts[i + 2]}"
+            return name
+    return model_path
+
+
+def get_embeddings(model_path=EMBEDDING_MODEL_PATH):
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    with _models_lock:
+        if model_path not in _models:
+            _models[model_path] = HuggingFaceEmbeddings(
+                model_name=model_path,
+                encode_kwargs={'normalize_embeddings': True}
+            )
+        return _models[model_path]
+
+
+class LazyEmbeddings(Embeddings):
+    """Embedding fourni par `provider`, demandé seulement au premier calcul : un index
+    chargé avant un fork ne charge pas le modèle (ni torch) dans le processus parent."""
+
+    def __init__(self, provider):
+        self._provider = provider
+
+    def embed_documents(self, texts):
+        return self._provider().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self._provider().embed_query(text)
+
+
+class HashingEmbeddings(Embeddings):
+    """Vecteurs obtenus par hachage des mots et bigrammes (sans accents ni casse) :
+    mêmes textes, mêmes vecteurs, sur n'importe quelle machine et sans téléchargement."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        text = unicodedata.normalize("NFKD", text.lower())
+        words = re.findall(r"\w{2,}", "".join(c for c in text if not unicodedata.combining(c)))
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dimension] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
@@ -0,0 +1,263 @@
+"""
+Construction hors ligne de l'index, sur le serveur ou sur une autre machine :
+
+    python -m backend.index_builder --pdfs pdfs --out faiss_index
+    python -m backend.index_builder --out faiss_index --verify
+
+Les PDFs sont lus et découpés en parallèle (un processus par cœur), dédupliqués,
+puis chaque document est vectorisé dans son shard. Le dossier produit contient les
+shards, les chunks, le rapport de déduplication et un manifest.json (modèle
+d'embedding, paramètres, versions des bibliothèques, SHA-256 de chaque fichier).
+Il ne contient ni horodatage ni identifiant aléatoire : des entrées identiques
+donnent des fichiers identiques octet pour octet. L'application web se contente
+de charger ce dossier s'il est présent.
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from backend.dedup import ChunkDeduplicator, strip_repeated_lines, save_report
+from backend.document_catalog import file_hash
+from backend.embeddings import EMBEDDING_MODEL_PATH, embedding_model_id, get_embeddings
+from backend.sharded_index import ShardedIndex, group_by_file
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.pkl"
+# Découpage (valeurs à choisir avec retrieval_eval.py)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "750"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
+# Fichiers écrits par l'application à côté de l'index, conservés d'une construction à l'autre
+RUNTIME_FILES = ("precomputed_answers.json", "query_log.jsonl")
+VERSIONED_PACKAGES = ("faiss-cpu", "torch", "sentence-transformers", "langchain-community", "pypdf")
+
+
+def split_documents(docs, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    return text_splitter.split_documents(docs)
+
+
+def load_pdf_pages(path):
+    """Lit un PDF et retire ses en-têtes et pieds de page répétés.
+
+    Retourne (pages, lignes retirées, secondes, erreur).
+    """
+    start = time.perf_counter()
+    try:
+        docs = PyPDFLoader(path).load()
+    except Exception as e:
+        return [], [], time.perf_counter() - start, str(e)
+    repeated = strip_repeated_lines(docs)
+    for doc in docs:
+        doc.page_content = " ".join(doc.page_content.split())
+    return docs, repeated, time.perf_counter() - start, None
+
+
+def load_and_split_pdf(path):
+    """Lit et découpe un PDF.
+
+    Retourne (chunks, lignes retirées, nombre de pages, secondes, erreur).
+    """
+    start = time.perf_counter()
+    docs, repeated, _, error = load_pdf_pages(path)
+    return split_documents(docs), repeated, len(docs), time.perf_counter() - start, error
+
+
+def checksums(root):
+    """SHA-256 de chaque fichier de l'artefact, par chemin relatif (séparateur « / »)."""
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            relpath = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, "/")
+            if relpath == MANIFEST_FILE or relpath in RUNTIME_FILES:
+                continue
+            result[relpath] = file_hash(os.path.join(dirpath, filename))
+    return result
+
+
+def read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def verify(index_dir, manifest=None):
+    """Fichiers manquants ou modifiés par rapport au manifest (liste vide si tout est intact)."""
+    manifest = manifest or read_manifest(index_dir)
+    if manifest is None:
+        return [f"{MANIFEST_FILE} : absent"]
+    problems = []
+    for relpath, expected in manifest.get("checksums", {}).items():
+        path = os.path.join(index_dir, *relpath.split("/"))
+        if not os.path.exists(path):
+            problems.append(f"{relpath} : absent")
+        elif file_hash(path) != expected:
+            problems.append(f"{relpath} : contenu modifié")
+    return problems
+
+
+def compatibility_problems(manifest, model_path=EMBEDDING_MODEL_PATH):
+    """Différences entre l'artefact et la configuration courante (format, modèle, découpage)."""
+    problems = []
+    if manifest.get("format_version") != FORMAT_VERSION:
+        problems.append(f"format {manifest.get('format_version')} au lieu de {FORMAT_VERSION}")
+    expected_model = embedding_model_id(model_path)
+    if manifest.get("embedding_model") != expected_model:
+        problems.append(f"modèle {manifest.get('embedding_model')} au lieu de {expected_model}")
+    chunking = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    if manifest.get("chunking") != chunking:
+        problems.append(f"découpage {manifest.get('chunking')} au lieu de {chunking}")
+    return problems
+
+
+def reject(index_dir):
+    """Écarte le manifest d'un artefact inutilisable : l'index sera reconstruit et tenu
+    à jour par l'application, sans revérifier l'artefact à chaque démarrage."""
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    try:
+        os.replace(path, path + ".rejected")
+    except OSError as e:
+        print(f"Impossible d'écarter {path}: {e}")
+
+
+def _package_versions():
+    versions = {}
+    for package in VERSIONED_PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def build(pdf_folder, out_dir, workers=None, model_path=EMBEDDING_MODEL_PATH):
+    """Construit l'artefact complet dans un dossier temporaire puis le met en place."""
+    import torch
+
+    workers = workers or os.cpu_count()
+    timings = {}
+    files = sorted(f for f in os.listdir(pdf_folder) if f.endswith(".pdf"))
+    paths = [os.path.join(pdf_folder, f) for f in files]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(load_and_split_pdf, paths))
+    texts, boilerplate, documents = [], {}, []
+    for file, path, (chunks, repeated, pages, _, error) in zip(files, paths, results):
+        if error:
+            print(f"Erreur lors du chargement de {file}: {error}")
+        if repeated:
+            boilerplate[file] = repeated
+        texts.extend(chunks)
+        documents.append({"file": file, "sha256": file_hash(path), "pages": pages, "chunks": len(chunks), "error": error})
+    timings["extraction"] = time.perf_counter() - start
+
+    deduplicator = ChunkDeduplicator()
+    by_file = group_by_file(deduplicator.deduplicate(texts))
+
+    staging = f"{out_dir.rstrip(os.sep)}.build-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    torch.set_num_threads(workers)
+    embeddings = get_embeddings(model_path)
+    index = ShardedIndex(
+        os.path.join(staging, "shards"),
+        lambda: embeddings,
+        categories_file=os.path.join(pdf_folder, "categories.json")
+    )
+    start = time.perf_counter()
+    for filename in sorted(by_file):
+        index.build_shard(filename, by_file[filename])
+    timings["embedding"] = time.perf_counter() - start
+    os.makedirs(staging, exist_ok=True)
+
+    with open(os.path.join(staging, CHUNKS_FILE), "wb") as f:
+        pickle.dump(texts, f, protocol=4)
+    report = dict(deduplicator.last_report, boilerplate=boilerplate)
+    for volatile in ("seconds", "built_at"):
+        report.pop(volatile, None)
+    save_report(staging, report)
+
+    dimension = next((db.index.d for db, _ in index.shards.values()), None)
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "embedding_model": embedding_model_id(model_path),
+        "embedding_dimension": dimension,
+        "chunking": {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP},
+        "dedup_threshold": deduplicator.threshold,
+        "documents": documents,
+        "chunks": len(texts),
+        "indexed_chunks": index.ntotal,
+        "index_fingerprint": index.fingerprint(),
+        "versions": dict(_package_versions(), python=sys.version.split()[0]),
+        "checksums": checksums(staging),
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    if os.path.isdir(out_dir):
+        for name in RUNTIME_FILES:
+            if os.path.exists(os.path.join(out_dir, name)):
+                shutil.copy2(os.path.join(out_dir, name), os.path.join(staging, name))
+        old = f"{out_dir.rstrip(os.sep)}.old-{os.getpid()}"
+        os.replace(out_dir, old)
+        os.replace(staging, out_dir)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(staging, out_dir)
+    return manifest, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construction hors ligne de l'index du Chatbot FS-UEb")
+    parser.add_argument("--pdfs", default="pdfs", help="Dossier des PDFs")
+    parser.add_argument("--out", default="faiss_index", help="Dossier de l'artefact produit")
+    parser.add_argument("--corpus", help="Corpus de corpora.json (remplace --pdfs et --out)")
+    parser.add_argument("--workers", type=int, default=None, help="Processus de lecture (par défaut : nombre de cœurs)")
+    parser.add_argument("--model-path", default=EMBEDDING_MODEL_PATH, help="Modèle d'embedding (chemin local)")
+    parser.add_argument("--verify", action="store_true", help="Vérifie l'artefact existant sans reconstruire")
+    args = parser.parse_args()
+    if args.corpus:
+        from backend.corpus_manager import load_corpora
+
+        corpora = load_corpora()[1]
+        if args.corpus not in corpora:
+            print(f"Corpus inconnu : {args.corpus} (disponibles : {', '.join(corpora)})")
+            raise SystemExit(1)
+        args.pdfs, args.out = corpora[args.corpus]["pdf_folder"], corpora[args.corpus]["index_dir"]
+
+    if args.verify:
+        manifest = read_manifest(args.out)
+        problems = verify(args.out, manifest)
+        if manifest is not None:
+            problems = compatibility_problems(manifest, args.model_path) + problems
+        for problem in problems:
+            print(f"  {problem}")
+        print("Artefact intact ✅" if not problems else f"{len(problems)} problème(s) détecté(s)")
+        raise SystemExit(1 if problems else 0)
+
+    manifest, timings = build(args.pdfs, args.out, args.workers, args.model_path)
+    print(
+        f"{len(manifest['documents'])} document(s), {manifest['chunks']} chunks, "
+        f"{manifest['indexed_chunks']} indexés ({manifest['embedding_model']})"
+    )
+    print(f"Lecture : {timings['extraction']:.1f} s, embedding : {timings['embedding']:.1f} s")
+    print(f"Empreinte de l'index : {manifest['index_fingerprint']} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+import requests
+from langchain_ollama import OllamaLLM
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "gemma:2b")
+# Durée (en secondes) pendant laquelle Ollama garde le modèle en mémoire après une requête.
+KEEP_ALIVE = int(os.getenv("OLLAMA_KEEP_ALIVE", "1800"))
+# Intervalle des pings de maintien en mémoire (par défaut la moitié du keep_alive).
+PING_INTERVAL = int(os.getenv("OLLAMA_PING_INTERVAL", str(max(KEEP_ALIVE // 2, 60))))
+# Délai de lecture maximal entre deux fragments de réponse (plus d'attente illimitée)
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+
+DEFAULT_OPTIONS = {
+    "temperature": 0.1,
+    "num_ctx": 1024,
+    "num_thread": 4,
+    "num_gpu": 0,
+    "repeat_penalty": 1.1,
+    "top_k": 10,
+    "top_p": 0.9,
+}
+
+
+class LLMManager:
+    """Cycle de vie des modèles Ollama : préchauffage unique par processus,
+    keep_alive, pings périodiques et mesure du temps jusqu'au premier token."""
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, keep_alive=KEEP_ALIVE, ping_interval=PING_INTERVAL):
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+        self._lock = threading.Lock()
+        self._llms = {}
+        self._last_used = {}
+        self._pinged = set()
+        self._warming = set()
+        self._load_durations = {}
+        self._ttft = {"cold": [], "warm": []}
+        self._stop = threading.Event()
+        self._ping_thread = None
+
+    def get_llm(self, model=DEFAULT_MODEL, **options):
+        """Retourne une instance OllamaLLM partagée pour ce modèle et ces options."""
+        params = dict(DEFAULT_OPTIONS, **options)
+        key = (model, tuple(sorted((k, str(v)) for k, v in params.items())))
+        with self._lock:
+            if key not in self._llms:
+                self._llms[key] = OllamaLLM(
+                    model=model,
+                    base_url=self.base_url,
+                    keep_alive=self.keep_alive,
+                    client_kwargs={"timeout": READ_TIMEOUT},
+                    **params
+                )
+            return self._llms[key]
+
+    def is_warm(self, model=DEFAULT_MODEL):
+        """Vrai si le modèle a été utilisé depuis moins que le keep_alive."""
+        last = self._last_used.get(model)
+        if last is None:
+            return False
+        return self.keep_alive < 0 or time.time() - last < self.keep_alive
+
+    def warm_up(self, model=DEFAULT_MODEL):
+        """Charge le modèle sans générer de token (requête sans prompt)."""
+        if self.is_warm(model):
+            return True
+        try:
+            start = time.time()
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": model, "keep_alive": self.keep_alive},
+                timeout=300
+            )
+            response.raise_for_status()
+            load_ns = response.json().get("load_duration")
+            self._load_durations[model] = load_ns / 1e9 if load_ns else time.time() - start
+            self._last_used[model] = time.time()
+        except Exception as e:
+            print(f"Erreur de préchauffage du modèle {model}: {e}")
+            return False
+        self._pinged.add(model)
+        self._start_pinger()
+        return True
+
+    def warm_up_async(self, model=DEFAULT_MODEL):
+        """Lance le préchauffage en arrière-plan (un seul à la fois par modèle)."""
+        with self._lock:
+            if model in self._warming or self.is_warm(model):
+                return
+            self._warming.add(model)
+
+        def run():
+            try:
+                self.warm_up(model)
+            finally:
+                with self._lock:
+                    self._warming.discard(model)
+
+        threading.Thread(target=run, name=f"ollama-warmup-{model}", daemon=True).start()
+
+    def _start_pinger(self):
+        with self._lock:
+            if self._ping_thread and self._ping_thread.is_alive():
+                return
+            self._ping_thread = threading.Thread(target=self._ping_loop, name="ollama-keepalive", daemon=True)
+            self._ping_thread.start()
+
+    def _ping_loop(self):
+        while not self._stop.wait(self.ping_interval):
+            # Un ping en échec (Ollama redémarré, surchargé) fait considérer le modèle
+            # comme froid, mais il reste dans la liste : le tour suivant le retente.
+            for model in list(self._pinged):
+                try:
+                    requests.post(
+                        f"{self.base_url}/api/generate",
+                        json={"model": model, "keep_alive": self.keep_alive},
+                        timeout=60
+                    ).raise_for_status()
+                    self._last_used[model] = time.time()
+                except Exception as e:
+                    self._last_used.pop(model, None)
+                    print(f"Ping keep_alive du modèle {model} en échec: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def record_first_token(self, model, seconds, cold):
+        """Enregistre un temps jusqu'au premier token, classé à froid ou à chaud."""
+        with self._lock:
+            samples = self._ttft["cold" if cold else "warm"]
+            samples.append(seconds)
+            del samples[:-100]
+        self.mark_used(model)
+
+    def mark_used(self, model):
+        self._last_used[model] = time.time()
+        self._pinged.add(model)
+        self._start_pinger()
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for kind, samples in self._ttft.items():
+                result[f"ttft_{kind}_count"] = len(samples)
+                result[f"ttft_{kind}_avg"] = sum(samples) / len(samples) if samples else None
+            result["load_durations"] = dict(self._load_durations)
+            result["warm_models"] = [m for m in self._last_used if self.is_warm(m)]
+            return result
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_llm_manager():
+    """Instance unique par processus, partagée par toutes les sessions."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = LLMManager()
+        return _manager
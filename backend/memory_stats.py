@@ -0,0 +1,164 @@
+"""
+Mesure de la mémoire par composant (modèle d'embedding, vecteurs FAISS, docstore,
+chunks, caches, état des sessions) pour repérer les fuites.
+
+    python -m backend.memory_stats   # snapshot JSON du processus courant
+"""
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+_logics = weakref.WeakSet()
+
+
+def register_logic(logic):
+    """Déclare une instance d'OptimizedChatbotLogic à inclure dans les mesures."""
+    _logics.add(logic)
+
+
+def resident_memory():
+    """Mémoire résidente du processus en octets (/proc, API Windows, sinon pic via getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == "win32":
+        return _windows_working_set()
+    # resource n'existe pas sous Windows : importé seulement ici
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_working_set():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return 0
+    return counters.WorkingSetSize
+
+
+def deep_sizeof(obj, seen=None):
+    """Taille approximative d'un objet et de tout ce qu'il référence."""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__") and not isinstance(current, type):
+            stack.append(current.__dict__)
+    return total
+
+
+def _embedding_model_size(logic):
+    embeddings = logic._embeddings
+    client = getattr(embeddings, "_client", None) if embeddings is not None else None
+    if client is None:
+        return 0
+    return sum(p.numel() * p.element_size() for p in client.parameters())
+
+
+def _session_states():
+    try:
+        from streamlit.runtime import Runtime
+        sessions = Runtime.instance()._session_mgr.list_active_sessions()
+        return [info.session.session_state.filtered_state for info in sessions]
+    except Exception:
+        return None
+
+
+def _count_instances(cls_name):
+    return sum(1 for obj in gc.get_objects() if type(obj).__name__ == cls_name)
+
+
+def snapshot():
+    """Répartition de la mémoire par composant, en octets."""
+    components = {
+        "embedding_model": 0,
+        "faiss_vectors": 0,
+        "docstore": 0,
+        "chunks": 0,
+        "response_cache": 0,
+        "sessions": 0,
+    }
+    logics = list(_logics)
+    models = set()
+    for logic in logics:
+        # Le modèle d'embedding est partagé entre les corpus : compté une seule fois
+        if id(logic._embeddings) not in models:
+            models.add(id(logic._embeddings))
+            components["embedding_model"] += _embedding_model_size(logic)
+        components["faiss_vectors"] += logic.index.vector_bytes()
+        components["docstore"] += deep_sizeof(logic.index.docstores())
+        components["chunks"] += deep_sizeof(logic.texts or [])
+        components["response_cache"] += deep_sizeof(logic.cache_responses)
+
+    sessions = _session_states()
+    if sessions is not None:
+        # Les objets partagés (chunks, retriever) sont déjà comptés ci-dessus
+        shared = set()
+        for logic in logics:
+            shared.update({id(logic.texts), id(logic.retriever), id(logic.index)})
+        for state in sessions:
+            components["sessions"] += deep_sizeof(
+                {k: v for k, v in state.items() if id(v) not in shared}
+            )
+
+    rss = resident_memory()
+    return {
+        "timestamp": time.time(),
+        "pid": os.getpid(),
+        "rss": rss,
+        "components": components,
+        "unattributed": max(rss - sum(components.values()), 0),
+        "live_sessions": len(sessions) if sessions is not None else None,
+        "chatbot_logic_instances": _count_instances("OptimizedChatbotLogic"),
+        "executors": sum(1 for obj in gc.get_objects() if isinstance(obj, ThreadPoolExecutor)),
+        "threads": threading.active_count(),
+    }
+
+
+def format_bytes(size):
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} To"
+
+
+if __name__ == "__main__":
+    print(json.dumps(snapshot(), indent=2))
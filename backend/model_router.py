@@ -0,0 +1,117 @@
+import os
+import re
+import threading
+from backend.llm_manager import DEFAULT_MODEL
+
+FAST_MODEL = os.getenv("OLLAMA_FAST_MODEL", "qwen2.5:0.5b")
+
+# Chaque niveau fixe son modèle, son plafond de tokens (num_predict), ses séquences
+# d'arrêt et le budget de longueur au-delà duquel on coupe le flux.
+TIERS = {
+    "fast": {
+        "model": FAST_MODEL,
+        "num_predict": 64,
+        "stop": ["\n\n", "Question:", "Contexte:"],
+        "max_chars": 280,
+        "max_sentences": 2,
+    },
+    "full": {
+        "model": DEFAULT_MODEL,
+        "num_predict": 192,
+        "stop": ["Question:", "Contexte:"],
+        "max_chars": 700,
+        "max_sentences": 3,
+    },
+}
+
+FACTUAL_PATTERN = re.compile(
+    r"\b(quand|date|dates|heure|horaire|horaires|frais|co[uû]t|prix|montant|combien|"
+    r"où|lieu|salle|adresse|d[ée]lai|t[ée]l[ée]phone|email|contact)\b",
+    re.IGNORECASE
+)
+OPEN_PATTERN = re.compile(
+    r"\b(pourquoi|expliqu\w*|d[ée]cri\w*|diff[ée]rence\w*|compar\w*|conseil\w*|"
+    r"avantages?|proc[ée]dure|d[ée]taill\w*)\b",
+    re.IGNORECASE
+)
+# Fin de phrase : ponctuation suivie d'une majuscule. Le mot qui la précède ne doit
+# être ni un nombre (« 1. », « 2.5 ») ni une abréviation courte (« art. », « FCFA. »).
+SENTENCE_END = re.compile(r"(\w*)[.!?]\s+(?=[A-ZÀ-ÖØ-Þ])")
+
+
+def count_sentences(text):
+    return sum(
+        1 for match in SENTENCE_END.finditer(text)
+        if len(match.group(1)) > 4 and not any(c.isdigit() for c in match.group(1))
+    )
+
+
+class ModelRouter:
+    """Oriente les recherches factuelles courtes vers un modèle rapide et garde
+    le modèle principal pour les questions ouvertes."""
+
+    def __init__(self, tiers=TIERS, max_fast_words=12):
+        self.tiers = tiers
+        self.max_fast_words = max_fast_words
+        self._lock = threading.Lock()
+        self._counts = {name: 0 for name in tiers}
+        self._latencies = {name: [] for name in tiers}
+        self._fallbacks = 0
+
+    def route(self, user_query):
+        words = user_query.split()
+        if (len(words) <= self.max_fast_words
+                and FACTUAL_PATTERN.search(user_query)
+                and not OPEN_PATTERN.search(user_query)):
+            return "fast"
+        return "full"
+
+    def config(self, tier):
+        return self.tiers[tier]
+
+    def budget_reached(self, tier, text):
+        """Vrai dès que la réponse atteint le budget de longueur du niveau."""
+        config = self.tiers[tier]
+        if len(text) >= config["max_chars"]:
+            return True
+        return count_sentences(text) >= config["max_sentences"]
+
+    def record(self, tier, latency):
+        with self._lock:
+            self._counts[tier] += 1
+            samples = self._latencies[tier]
+            samples.append(latency)
+            del samples[:-200]
+
+    def record_fallback(self):
+        with self._lock:
+            self._fallbacks += 1
+
+    def stats(self):
+        with self._lock:
+            averages = {
+                name: (sum(samples) / len(samples) if samples else None)
+                for name, samples in self._latencies.items()
+            }
+            saved = 0.0
+            if averages["fast"] is not None and averages["full"] is not None:
+                saved = max(averages["full"] - averages["fast"], 0.0) * self._counts["fast"]
+            return {
+                "counts": dict(self._counts),
+                "avg_latency": averages,
+                "fallbacks": self._fallbacks,
+                "estimated_time_saved": saved,
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router():
+    """Routeur unique par processus, pour agréger les statistiques de toutes les sessions."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,162 @@
+"""
+Création en masse des comptes étudiants depuis un CSV (username,email[,password][,role]).
+
+    python -m backend.provisioning etudiants.csv --credentials-out identifiants.csv
+
+Le CSV est lu par lots ; les mots de passe sont hachés en parallèle puis les lignes
+sont envoyées à Postgres par COPY dans une table temporaire. Une seule requête
+insère ensuite les nouveaux comptes et liste les doublons déjà en base. Les doublons
+sont détectés par les index uniques de migrations/001_users_unique.sql, qui doit
+avoir été appliquée.
+"""
+import argparse
+import csv
+import io
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from dotenv import load_dotenv
+from backend.auth import AuthManager, MIGRATION_FILE, normalize_email
+
+
+def hash_password(args):
+    password, rounds = args
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _copy_escape(value):
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class BulkProvisioner:
+    def __init__(self, auth_manager, workers=None, batch_size=2000, rounds=12, generate_passwords=False):
+        self.auth_manager = auth_manager
+        self.conn = auth_manager.conn
+        self.generate_passwords = generate_passwords
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.rounds = rounds
+
+    def _read_batches(self, csv_file, file_duplicates, generated):
+        seen_usernames, seen_emails = set(), set()
+        batch = []
+        for line_no, row in enumerate(csv.DictReader(csv_file), start=2):
+            username = (row.get("username") or "").strip()
+            email = normalize_email(row.get("email") or "")
+            if not username or not email:
+                file_duplicates.append((line_no, username, email, "ligne incomplète"))
+                continue
+            if username in seen_usernames or email in seen_emails:
+                file_duplicates.append((line_no, username, email, "doublon dans le fichier"))
+                continue
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            password = (row.get("password") or "").strip()
+            if not password and not self.generate_passwords:
+                file_duplicates.append((line_no, username, email, "mot de passe manquant"))
+                continue
+            if not password:
+                password = secrets.token_urlsafe(9)
+                generated.append((username, email, password))
+            batch.append((username, email, password, (row.get("role") or "user").strip()))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def provision(self, csv_path):
+        if not self.conn:
+            raise RuntimeError("Erreur de connexion à la base de données.")
+        if not self.auth_manager.has_unique_constraints():
+            raise RuntimeError(f"Contraintes d'unicité absentes sur users : appliquer {MIGRATION_FILE}")
+        start = time.time()
+        file_duplicates, generated = [], []  # lignes rejetées, mots de passe générés
+        staged = 0
+
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "CREATE TEMP TABLE users_staging "
+            "(username TEXT, email TEXT, password_hash TEXT, role TEXT) ON COMMIT DROP"
+        )
+        with open(csv_path, newline="", encoding="utf-8-sig") as csv_file, \
+                ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for batch in self._read_batches(csv_file, file_duplicates, generated):
+                hashes = pool.map(
+                    hash_password,
+                    [(password, self.rounds) for _, _, password, _ in batch],
+                    chunksize=max(len(batch) // (self.workers * 4), 1)
+                )
+                buffer = io.StringIO()
+                for (username, email, _, role), password_hash in zip(batch, hashes):
+                    buffer.write("\t".join(_copy_escape(v) for v in (username, email, password_hash, role)) + "\n")
+                buffer.seek(0)
+                cursor.copy_expert("COPY users_staging (username, email, password_hash, role) FROM STDIN", buffer)
+                staged += len(batch)
+
+        cursor.execute("""
+            WITH inserted AS (
+                INSERT INTO users (username, email, password_hash, role)
+                SELECT username, email, password_hash, role FROM users_staging
+                ON CONFLICT DO NOTHING
+                RETURNING username
+            )
+            SELECT s.username, s.email FROM users_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.username = s.username)
+        """)
+        db_duplicates = cursor.fetchall()
+        self.conn.commit()
+        cursor.close()
+
+        skipped = {username for username, _ in db_duplicates}
+        return {
+            "staged": staged,
+            "created": staged - len(db_duplicates),
+            "file_duplicates": file_duplicates,
+            "db_duplicates": db_duplicates,
+            "generated_passwords": [g for g in generated if g[0] not in skipped],
+            "seconds": time.time() - start,
+        }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Création en masse des comptes utilisateurs")
+    parser.add_argument("csv_path", help="CSV avec les colonnes username,email[,password][,role]")
+    parser.add_argument("--workers", type=int, default=None, help="Processus de hachage (par défaut : nombre de cœurs)")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=12, help="Coût bcrypt")
+    parser.add_argument("--credentials-out", help="Génère les mots de passe manquants et les écrit dans ce CSV")
+    args = parser.parse_args()
+
+    auth_manager = AuthManager()
+    provisioner = BulkProvisioner(
+        auth_manager, args.workers, args.batch_size, args.rounds,
+        generate_passwords=bool(args.credentials_out)
+    )
+    try:
+        report = provisioner.provision(args.csv_path)
+    except Exception as e:
+        if auth_manager.conn:
+            auth_manager.conn.rollback()
+        print(f"Erreur: {e}")
+        raise SystemExit(1)
+
+    print(f"{report['created']} compte(s) créé(s) sur {report['staged']} en {report['seconds']:.1f} s")
+    for line_no, username, email, reason in report["file_duplicates"]:
+        print(f"  ligne {line_no} ignorée ({reason}) : {username} <{email}>")
+    for username, email in report["db_duplicates"]:
+        print(f"  déjà existant : {username} <{email}>")
+
+    if report["generated_passwords"]:
+        with open(args.credentials_out, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["username", "email", "password"])
+            writer.writerows(report["generated_passwords"])
+        print(f"Mots de passe générés écrits dans {args.credentials_out}")
+
+
+if __name__ == "__main__":
+    main()
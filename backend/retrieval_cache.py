@@ -0,0 +1,81 @@
+"""
+Cache des résultats de recherche : pour une question normalisée, les chunks retrouvés
+et le contexte déjà formaté. Une question fréquente (même reformulée en casse,
+espaces ou ponctuation) ne recalcule ni l'embedding, ni la recherche FAISS, ni le
+contexte, même quand la réponse doit être régénérée. Les filtres explicites font
+partie de la clé. Le cache est vidé dès que la version de l'index change.
+"""
+import os
+import threading
+from collections import OrderedDict
+from backend.warmup import query_key
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
+
+
+class RetrievalCache:
+    """LRU borné : (question normalisée, filtres) -> (identifiants, documents, contexte)."""
+
+    def __init__(self, max_entries=RETRIEVAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._index_key = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "time_saved": 0.0, "miss_time": 0.0}
+
+    def _check_version(self, index_key):
+        if index_key != self._index_key:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._index_key = index_key
+
+    def get(self, query, index_key, filters=None):
+        key = query_key(query, filters)
+        with self._lock:
+            self._check_version(index_key)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            self._stats["time_saved"] += entry["cost"]
+            return entry
+
+    def put(self, query, index_key, docs, context, cost, filters=None):
+        """Enregistre une recherche ; `cost` est sa durée, économisée à chaque succès."""
+        entry = {
+            "ids": [getattr(doc, "id", None) for doc in docs],
+            "docs": docs,
+            "context": context,
+            "cost": cost,
+        }
+        key = query_key(query, filters)
+        with self._lock:
+            self._stats["miss_time"] += cost
+            if index_key != self._index_key:
+                # Recherche faite sur un index remplacé entre-temps : servie une fois, pas gardée
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+                "invalidations": self._stats["invalidations"],
+                "time_saved": self._stats["time_saved"],
+                "avg_retrieval_ms": self._stats["miss_time"] * 1000 / self._stats["misses"] if self._stats["misses"] else None,
+            }
@@ -0,0 +1,267 @@
+"""
+Démon de recherche local sur socket Unix.
+
+    python -m backend.retrieval_daemon --socket /tmp/chatbot-retrieval.sock
+
+Il possède le modèle d'embedding et l'index FAISS. Les requêtes concurrentes
+reçues pendant une courte fenêtre sont vectorisées et recherchées en un seul lot.
+Protocole : une ligne JSON par requête, une ligne JSON par réponse. La version
+d'index renvoyée est l'empreinte du contenu de l'index : stable d'un redémarrage
+du démon à l'autre, elle sert de clé aux caches des clients.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from pydantic import ConfigDict
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "/tmp/chatbot-retrieval.sock")
+# Intervalle maximal entre deux lectures de la version de l'index du démon
+VERSION_CHECK_INTERVAL = 2.0
+
+
+class RetrievalDaemon:
+    def __init__(self, logic, socket_path=RETRIEVAL_SOCKET, window_ms=10, max_batch=32):
+        self.logic = logic
+        self.socket_path = socket_path
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue = None
+        self.batch_sizes = {}
+        self.requests = 0
+        self.total_queue_wait = 0.0
+        self.total_search_time = 0.0
+
+    async def serve(self):
+        self.queue = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        asyncio.create_task(self._batch_loop())
+        print(f"Démon de recherche prêt sur {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                if request.get("cmd") == "stats":
+                    response = self.stats()
+                else:
+                    future = asyncio.get_running_loop().create_future()
+                    await self.queue.put((request, future, time.monotonic()))
+                    response = await future
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except Exception as e:
+            print(f"Erreur client du démon de recherche: {e}")
+        finally:
+            writer.close()
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.monotonic()
+            for _, _, enqueued in batch:
+                self.total_queue_wait += started - enqueued
+            try:
+                results = await loop.run_in_executor(None, self._search_batch, [req for req, _, _ in batch])
+            except Exception as e:
+                results = [{"error": str(e)}] * len(batch)
+            self.total_search_time += time.monotonic() - started
+            self.requests += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def index_version(self):
+        """Empreinte du contenu de l'index (et non un compteur propre à ce processus)."""
+        return self.logic.index_fingerprint() or ""
+
+    def _search_batch(self, requests):
+        index = self.logic.index
+        version = self.index_version()
+        if not len(index):
+            return [{"ids": [], "scores": [], "documents": [], "index_version": version}] * len(requests)
+        vectors = self.logic.embeddings.embed_documents([req["query"] for req in requests])
+        # Les filtres dépendent de chaque requête : un lot est recherché par jeu de filtres
+        groups = {}
+        for i, req in enumerate(requests):
+            filters = req.get("filters") or {}
+            implicit = index.implicit_filters(req["query"], filters) if req.get("auto_filters", True) else {}
+            key = json.dumps([filters, implicit], sort_keys=True)
+            groups.setdefault(key, (filters, implicit, []))[2].append(i)
+        rows = [None] * len(requests)
+        for filters, implicit, members in groups.values():
+            k = max(requests[i].get("k", 3) for i in members)
+            found = index.search_vectors([vectors[i] for i in members], k, filters or None, implicit or None)
+            for i, hits in zip(members, found):
+                rows[i] = hits
+
+        results = []
+        for req, hits in zip(requests, rows):
+            hits = hits[:req.get("k", 3)]
+            result = {
+                "ids": [doc_id for doc_id, _, _ in hits],
+                "scores": [score for _, _, score in hits],
+                "index_version": version,
+            }
+            if req.get("with_documents", True):
+                result["documents"] = [
+                    {"page_content": doc.page_content, "metadata": doc.metadata} for _, doc, _ in hits
+                ]
+            results.append(result)
+        return results
+
+    def stats(self):
+        batches = sum(self.batch_sizes.values())
+        return {
+            "requests": self.requests,
+            "batches": batches,
+            "avg_batch_size": self.requests / batches if batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "avg_queue_wait_ms": 1000 * self.total_queue_wait / self.requests if self.requests else 0.0,
+            "avg_batch_time_ms": 1000 * self.total_search_time / batches if batches else 0.0,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "window_ms": self.window * 1000,
+            "index_version": self.index_version(),
+            "chunks": len(self.logic.texts or []),
+        }
+
+
+class RetrievalClient:
+    """Client léger du démon : une connexion par thread, sans modèle ni index en mémoire."""
+
+    def __init__(self, socket_path=RETRIEVAL_SOCKET, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        # Dernière empreinte de l'index vue (réponse de recherche ou stats)
+        self.index_version = None
+        self._version_checked = 0.0
+
+    def _close(self):
+        for name in ("conn", "sock"):
+            resource = getattr(self._local, name, None)
+            setattr(self._local, name, None)
+            if resource is not None:
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+
+    def _call(self, payload):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            reused = conn is not None
+            try:
+                if conn is None:
+                    sock = self._local.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.settimeout(self.timeout)
+                    sock.connect(self.socket_path)
+                    conn = self._local.conn = sock.makefile("rwb")
+                conn.write(json.dumps(payload, ensure_ascii=False).encode() + b"\n")
+                conn.flush()
+                line = conn.readline()
+                if not line:
+                    raise ConnectionError("Connexion fermée par le démon")
+                return json.loads(line)
+            except (OSError, ValueError) as e:
+                self._close()
+                # Seule une connexion réutilisée que le démon a fermée entre-temps est
+                # retentée ; après un délai dépassé la requête n'est pas renvoyée.
+                if attempt or not reused or isinstance(e, (TimeoutError, ValueError)):
+                    raise
+
+    def available(self):
+        try:
+            self.stats()
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Démon de recherche indisponible: {e}")
+            return False
+
+    def _seen_version(self, version):
+        self.index_version = version
+        self._version_checked = time.monotonic()
+
+    def current_version(self, max_age=VERSION_CHECK_INTERVAL):
+        """Version de l'index du démon ; relue par `stats` si la dernière vue date de plus de `max_age` s."""
+        if self.index_version is None or time.monotonic() - self._version_checked > max_age:
+            self.stats()
+        return self.index_version
+
+    def search(self, query, k=3, filters=None, auto_filters=True):
+        result = self._call({"query": query, "k": k, "filters": filters or {}, "auto_filters": auto_filters})
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        self._seen_version(result.get("index_version"))
+        return result
+
+    def stats(self):
+        result = self._call({"cmd": "stats"})
+        self._seen_version(result.get("index_version"))
+        return result
+
+
+class DaemonRetriever(BaseRetriever):
+    """Retriever LangChain qui délègue la recherche au démon."""
+
+    client: RetrievalClient
+    k: int = 3
+    filters: dict = {}
+    auto_filters: bool = True
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(self, query, *, run_manager: CallbackManagerForRetrieverRun):
+        result = self.client.search(query, self.k, self.filters, self.auto_filters)
+        return [Document(**doc) for doc in result.get("documents", [])]
+
+
+def main():
+    from backend.chatbot_logic import OptimizedChatbotLogic, HeadlessState
+
+    parser = argparse.ArgumentParser(description="Démon de recherche du Chatbot FS-UEb")
+    parser.add_argument("--socket", default=RETRIEVAL_SOCKET)
+    parser.add_argument("--pdf-folder", default="pdfs")
+    parser.add_argument("--corpus", help="Corpus de corpora.json servi par ce démon (remplace --pdf-folder)")
+    parser.add_argument("--window-ms", type=float, default=10)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.corpus:
+        from backend.corpus_manager import load_corpora, corpus_options
+
+        default, corpora = load_corpora()
+        config = corpora[args.corpus]
+        options = dict(corpus_options(args.corpus, config, args.corpus == default), retrieval_socket="")
+        logic = OptimizedChatbotLogic(config["pdf_folder"], config["index_dir"], **options)
+    else:
+        logic = OptimizedChatbotLogic(args.pdf_folder, retrieval_socket="")
+    state = HeadlessState()
+    logic.initialize(state)
+    daemon = RetrievalDaemon(logic, args.socket, args.window_ms, args.max_batch)
+    asyncio.run(daemon.serve())
+
+
+if __name__ == "__main__":
+    main()
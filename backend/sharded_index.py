@@ -0,0 +1,325 @@
+"""
+Index FAISS découpé en un shard par document : chaque shard a ses vecteurs, son
+docstore et un fichier meta.json (fichier, catégorie, année académique). Remplacer
+un PDF ne reconstruit que son shard ; la recherche filtre les shards sur leurs
+métadonnées avant de les interroger en parallèle, puis fusionne les top-k.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pydantic import ConfigDict
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from backend.embeddings import LazyEmbeddings
+
+# Mots-clés (sans accents) reconnus dans les noms de fichiers et dans les questions
+CATEGORY_KEYWORDS = {
+    "emploi_du_temps": ["emploi du temps", "emplois du temps", "emploi_du_temps", "edt", "timetable", "planning"],
+    "reglement": ["reglement", "reglementation", "statut"],
+    "frais": ["frais", "scolarite", "paiement"],
+    "inscription": ["inscription", "admission", "concours"],
+    "examens": ["examen", "examens", "session", "deliberation"],
+}
+YEAR_PATTERN = re.compile(r"(20\d{2})(?:\s*[-_/]\s*(20\d{2}))?")
+
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c)).replace("_", " ").replace("-", " ")
+
+
+def detect_category(text):
+    folded = _fold(text)
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(re.search(rf"\b{re.escape(_fold(k))}\b", folded) for k in keywords):
+            return category
+    return None
+
+
+def detect_academic_year(text):
+    match = YEAR_PATTERN.search(text)
+    if not match:
+        return None
+    return f"{match.group(1)}-{match.group(2)}" if match.group(2) else match.group(1)
+
+
+def extract_filters(query):
+    """Filtres implicites d'une question : l'année citée (« l'emploi du temps 2025 »).
+
+    La catégorie n'est pas déduite de la question : un mot-clé ambigu (« session »,
+    « paiement ») suffirait à écarter tous les autres documents.
+    """
+    year = detect_academic_year(query)
+    return {"academic_year": year} if year else {}
+
+
+def content_signature(chunks):
+    """Empreinte des chunks d'un shard (texte et sources fusionnées)."""
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(chunk.page_content.encode("utf-8"))
+        digest.update(json.dumps(chunk.metadata.get("sources", []), sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def group_by_file(chunks):
+    by_file = {}
+    for chunk in chunks:
+        by_file.setdefault(os.path.basename(chunk.metadata.get("source", "inconnu")), []).append(chunk)
+    return by_file
+
+
+def shard_id_for(filename):
+    stem = re.sub(r"[^a-z0-9]+", "-", _fold(os.path.splitext(filename)[0])).strip("-")
+    digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:8]
+    return f"{stem[:48]}-{digest}"
+
+
+class ShardedIndex:
+    def __init__(self, root, embeddings_provider, categories_file=None, max_workers=4):
+        self.root = root
+        self._embeddings_provider = embeddings_provider
+        self.categories_file = categories_file
+        self.shards = {}
+        # Appelé après chaque shard construit : on_built(filename, meta)
+        self.on_built = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+
+    @property
+    def embeddings(self):
+        return self._embeddings_provider()
+
+    def _categories(self):
+        if self.categories_file and os.path.exists(self.categories_file):
+            try:
+                with open(self.categories_file, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def describe(self, filename):
+        """Métadonnées d'un document : catégorie (categories.json ou nom de fichier) et année."""
+        return {
+            "file": filename,
+            "category": self._categories().get(filename) or detect_category(filename) or "general",
+            "academic_year": detect_academic_year(filename),
+        }
+
+    def __len__(self):
+        return len(self.shards)
+
+    @property
+    def ntotal(self):
+        return sum(db.index.ntotal for db, _ in self.shards.values())
+
+    def vector_bytes(self):
+        return sum(db.index.ntotal * db.index.d * 4 for db, _ in self.shards.values())
+
+    def docstores(self):
+        return [db.docstore._dict for db, _ in self.shards.values()]
+
+    def fingerprint(self):
+        """Identifiant du contenu courant, qui change dès qu'un shard est remplacé."""
+        # Copie des shards : l'empreinte peut être lue pendant une ingestion
+        manifest = sorted((shard_id, meta.get("signature")) for shard_id, (_, meta) in list(self.shards.items()))
+        if not manifest:
+            return None
+        return hashlib.sha1(json.dumps(manifest).encode()).hexdigest()[:16]
+
+    def load(self):
+        """Charge tous les shards présents sur disque ; retourne les fichiers couverts."""
+        shards = {}
+        if os.path.isdir(self.root):
+            for shard_id in os.listdir(self.root):
+                path = os.path.join(self.root, shard_id)
+                meta_file = os.path.join(path, "meta.json")
+                if shard_id.startswith(".") or not os.path.exists(meta_file):
+                    continue
+                try:
+                    with open(meta_file, encoding="utf-8") as f:
+                        meta = json.load(f)
+                    # Modèle chargé au premier calcul d'embedding, pas à l'ouverture du shard
+                    db = FAISS.load_local(path, LazyEmbeddings(self._embeddings_provider), allow_dangerous_deserialization=True)
+                    shards[shard_id] = (db, meta)
+                except Exception as e:
+                    print(f"Erreur chargement du shard {shard_id}: {e}")
+        with self._lock:
+            self.shards = shards
+        return {meta["file"] for _, meta in shards.values()}
+
+    def build_shard(self, filename, chunks):
+        """Construit (ou remplace) le shard d'un document et l'échange atomiquement."""
+        if not chunks:
+            self.remove_shard(filename)
+            return None
+        shard_id = shard_id_for(filename)
+        # Autres documents dont des chunks ont été fusionnés dans ce shard (déduplication)
+        covers = sorted({
+            ref["source"] for chunk in chunks for ref in chunk.metadata.get("sources", [])
+        } - {filename})
+        meta = dict(
+            self.describe(filename),
+            shard_id=shard_id,
+            chunks=len(chunks),
+            covers=covers,
+            signature=content_signature(chunks)
+        )
+        for chunk in chunks:
+            chunk.metadata.update({k: meta[k] for k in ("category", "academic_year") if meta[k]})
+
+        start = time.perf_counter()
+        # Identifiants déterministes (et non des uuid) : mêmes chunks, mêmes fichiers
+        ids = [f"{shard_id}-{i:05d}" for i in range(len(chunks))]
+        db = FAISS.from_documents(chunks, self.embeddings, ids=ids)
+        final = os.path.join(self.root, shard_id)
+        tmp = os.path.join(self.root, f".tmp-{shard_id}-{os.getpid()}")
+        os.makedirs(self.root, exist_ok=True)
+        db.save_local(tmp)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1, sort_keys=True)
+        # Durée hors de meta.json pour que le shard écrit ne dépende que de son contenu
+        meta["embedding_seconds"] = time.perf_counter() - start
+        if os.path.exists(final):
+            old = os.path.join(self.root, f".old-{shard_id}-{os.getpid()}")
+            os.replace(final, old)
+            os.replace(tmp, final)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, final)
+
+        with self._lock:
+            shards = dict(self.shards)
+            shards[shard_id] = (db, meta)
+            self.shards = shards
+        if self.on_built:
+            self.on_built(filename, meta)
+        return shard_id
+
+    def is_outdated(self, filename, chunks):
+        """Vrai si le shard du document est absent ou ne correspond plus à ces chunks."""
+        shard = self.shards.get(shard_id_for(filename))
+        return shard is None or shard[1].get("signature") != content_signature(chunks)
+
+    def remove_shard(self, filename):
+        shard_id = shard_id_for(filename)
+        with self._lock:
+            shards = dict(self.shards)
+            removed = shards.pop(shard_id, None)
+            self.shards = shards
+        shutil.rmtree(os.path.join(self.root, shard_id), ignore_errors=True)
+        return removed is not None
+
+    def rebuild(self, by_file):
+        """Reconstruit tous les shards à partir des chunks groupés par document."""
+        for filename in set(self.load()) - set(by_file):
+            self.remove_shard(filename)
+        for filename, file_chunks in by_file.items():
+            self.build_shard(filename, file_chunks)
+
+    def select(self, filters=None, implicit=None):
+        """Shards dont les métadonnées correspondent aux filtres (valeur simple ou liste).
+
+        Les filtres implicites n'écartent que les shards qui les contredisent : un
+        document sans année reste candidat quand la question en cite une.
+        """
+        shards = list(self.shards.values())
+        if not filters and not implicit:
+            return shards
+        selected = []
+        for db, meta in shards:
+            # Un shard qui contient des chunks fusionnés répond aussi pour les documents couverts
+            descriptions = [meta] + [self.describe(filename) for filename in meta.get("covers", [])]
+            if any(
+                self._matches(description, filters or {})
+                and self._matches(description, implicit or {}, allow_missing=True)
+                for description in descriptions
+            ):
+                selected.append((db, meta))
+        return selected
+
+    def implicit_filters(self, query, filters=None):
+        """Filtres déduits de la question, retenus seulement si un shard y correspond exactement."""
+        filters = filters or {}
+        implicit = {key: value for key, value in extract_filters(query).items() if key not in filters}
+        if implicit and self.select(dict(filters, **implicit)):
+            return implicit
+        return {}
+
+    @staticmethod
+    def _matches(meta, filters, allow_missing=False):
+        for key, wanted in filters.items():
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            value = meta.get(key) or ""
+            if not value and allow_missing:
+                continue
+            if key == "academic_year":
+                ok = any(str(w) in value for w in wanted)
+            else:
+                ok = value in wanted
+            if not ok:
+                return False
+        return True
+
+    def search_vectors(self, vectors, k=3, filters=None, implicit=None):
+        """Recherche en lot : pour chaque vecteur, les k meilleurs (doc_id, document, score)."""
+        shards = self.select(filters, implicit)
+        if not shards:
+            return [[] for _ in vectors]
+        matrix = np.asarray(vectors, dtype=np.float32)
+
+        def _search(db):
+            scores, indices = db.index.search(matrix, min(k, db.index.ntotal))
+            rows = []
+            for row_scores, row_indices in zip(scores, indices):
+                hits = []
+                for score, i in zip(row_scores, row_indices):
+                    if i == -1:
+                        continue
+                    doc_id = db.index_to_docstore_id[int(i)]
+                    hits.append((doc_id, db.docstore.search(doc_id), float(score)))
+                rows.append(hits)
+            return rows
+
+        per_shard = list(self._executor.map(_search, [db for db, _ in shards]))
+        merged = []
+        for row in range(len(matrix)):
+            hits = [hit for shard_rows in per_shard for hit in shard_rows[row]]
+            hits.sort(key=lambda hit: hit[2])
+            # Un même texte ne doit pas occuper plusieurs des k places
+            unique, seen = [], set()
+            for hit in hits:
+                if hit[1].page_content not in seen:
+                    seen.add(hit[1].page_content)
+                    unique.append(hit)
+            merged.append(unique[:k])
+        return merged
+
+    def search(self, query, k=3, filters=None, implicit=None):
+        vector = self.embeddings.embed_query(query)
+        return [(doc, score) for _, doc, score in self.search_vectors([vector], k, filters, implicit)[0]]
+
+
+class ShardedRetriever(BaseRetriever):
+    """Retriever LangChain sur l'index shardé ; l'année citée dans la question écarte
+    les documents d'autres années s'il existe au moins un shard de cette année."""
+
+    index: ShardedIndex
+    k: int = 3
+    filters: dict = {}
+    auto_filters: bool = True
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(self, query, *, run_manager: CallbackManagerForRetrieverRun):
+        implicit = self.index.implicit_filters(query, self.filters) if self.auto_filters else {}
+        return [doc for doc, _ in self.index.search(query, self.k, self.filters or None, implicit or None)]
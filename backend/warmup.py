@@ -0,0 +1,259 @@
+"""
+Réponses pré-calculées : après chaque construction de l'index, on génère les réponses
+des questions rapides et des questions les plus fréquentes du journal anonymisé, puis
+on les sert instantanément tant que l'index ne change pas.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from backend.admission import Preempted
+
+QUICK_QUESTIONS = [
+    "Quels sont les programmes d'études disponibles ?",
+    "Comment s'inscrire à la faculté ?",
+    "Quels sont les frais de scolarité ?",
+    "Où trouve-t-on les emplois du temps ?"
+]
+
+QUERY_LOG_FILE = os.getenv("QUERY_LOG_FILE", "query_log.jsonl")
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+# Durée sans progression après laquelle un pré-calcul « en cours » est considéré interrompu
+RUNNING_TIMEOUT = 600
+# Attente (en secondes) avant de reprendre le pré-calcul quand des utilisateurs occupent le modèle
+WARMUP_PAUSE = float(os.getenv("WARMUP_PAUSE", "5"))
+
+_EMAIL = re.compile(r"\S+@\S+")
+_NUMBER = re.compile(r"\d{5,}")
+
+
+def normalize_query(query):
+    """Forme canonique d'une question : minuscules, espaces et ponctuation finale normalisés."""
+    text = unicodedata.normalize("NFC", query).lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*[?!.]+$", "", text)
+    return text
+
+
+def query_key(query, filters=None):
+    """Clé de cache d'une question : forme canonique, plus les filtres explicites s'il y en a."""
+    if not filters:
+        return normalize_query(query)
+    return normalize_query(query), json.dumps(filters, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def anonymize(query):
+    """Retire e-mails et longs numéros (matricules, téléphones) avant journalisation."""
+    return _NUMBER.sub("<num>", _EMAIL.sub("<email>", query))
+
+
+class QueryLog:
+    """Journal des questions, sans utilisateur ni session associés."""
+
+    def __init__(self, path=QUERY_LOG_FILE, max_lines=5000):
+        self.path = path
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+
+    def record(self, query):
+        entry = {"q": anonymize(normalize_query(query)), "t": int(time.time())}
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Erreur journal des requêtes: {e}")
+
+    def top(self, n, since_days=30):
+        if not os.path.exists(self.path):
+            return []
+        cutoff = time.time() - since_days * 86400
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()[-self.max_lines:]
+        counts = Counter()
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("t", 0) >= cutoff and "<" not in entry["q"]:
+                counts[entry["q"]] += 1
+        return [query for query, _ in counts.most_common(n)]
+
+
+class AnswerStore:
+    """Réponses pré-calculées, persistées dans le dossier de l'index et liées à sa version.
+
+    Seul le pré-calcul écrit le fichier ; les autres processus (workers de l'API,
+    Streamlit) le relisent quand il change. Les compteurs de succès restent en mémoire.
+    """
+
+    def __init__(self, index_dir, filename="precomputed_answers.json"):
+        self.path = os.path.join(index_dir, filename)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.data = self._load()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        try:
+            self._mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"index_key": None, "answers": {}, "progress": {}}
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.data = self._load()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def get(self, query, index_key):
+        with self._lock:
+            self._refresh()
+            answer = None
+            if self.data["index_key"] == index_key:
+                answer = self.data["answers"].get(normalize_query(query))
+            if answer:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return answer
+
+    def needs_run(self, index_key):
+        """Vrai si le pré-calcul de cette version n'est ni terminé ni en cours ailleurs
+        (un état « running » sans progression depuis RUNNING_TIMEOUT est abandonné)."""
+        with self._lock:
+            self._refresh()
+            if self.data["index_key"] != index_key:
+                return True
+            progress = self.data.get("progress", {})
+            if progress.get("state") == "done":
+                return False
+            if progress.get("state") == "running":
+                return time.time() - progress.get("updated", progress.get("started", 0)) > RUNNING_TIMEOUT
+            return True
+
+    def reset(self, index_key, total):
+        with self._lock:
+            now = time.time()
+            self.data = {
+                "index_key": index_key,
+                "answers": {},
+                "progress": {"state": "running", "done": 0, "total": total, "started": now, "updated": now},
+            }
+            self.save()
+
+    def put(self, query, answer):
+        with self._lock:
+            if answer:
+                self.data["answers"][normalize_query(query)] = answer
+            self.data["progress"]["done"] += 1
+            self.data["progress"]["updated"] = time.time()
+            self.save()
+
+    def finish(self, state="done"):
+        with self._lock:
+            self.data["progress"].update({"state": state, "finished": time.time()})
+            self.save()
+
+    def status(self):
+        with self._lock:
+            self._refresh()
+            lookups = self.hits + self.misses
+            return {
+                "index_key": self.data["index_key"],
+                "answers": len(self.data["answers"]),
+                "progress": dict(self.data["progress"]),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class WarmupRunner:
+    """Génère en arrière-plan les réponses des questions à pré-calculer."""
+
+    def __init__(self, logic, store, query_log, top_n=WARMUP_TOP_N):
+        self.logic = logic
+        self.store = store
+        self.query_log = query_log
+        self.top_n = top_n
+        self._thread = None
+        self._stop = threading.Event()
+
+    def questions(self):
+        seen = set()
+        result = []
+        for query in QUICK_QUESTIONS + self.query_log.top(self.top_n):
+            key = normalize_query(query)
+            if key not in seen:
+                seen.add(key)
+                result.append(query)
+        return result
+
+    def stop(self):
+        """Interrompt le pré-calcul après la réponse en cours."""
+        self._stop.set()
+
+    def schedule(self, index_key):
+        if self._stop.is_set() or index_key is None:
+            return False
+        if self._thread and self._thread.is_alive():
+            return False
+        if not self.store.needs_run(index_key):
+            return False
+        self._thread = threading.Thread(target=self._run, args=(index_key,), name="answers-warmup", daemon=True)
+        self._thread.start()
+        return True
+
+    def _generate(self, query, index_key):
+        """Génère la réponse en cédant la place aux utilisateurs : tant que le modèle
+        est demandé (ou si la génération est interrompue), on patiente puis on reprend."""
+        while not self._stop.is_set() and self.logic.index_fingerprint() == index_key:
+            if self.logic.admission.busy():
+                self._stop.wait(WARMUP_PAUSE)
+                continue
+            try:
+                return self.logic.generate_answer(query, background=True)
+            except Preempted:
+                self._stop.wait(WARMUP_PAUSE)
+        return None
+
+    def _run(self, index_key):
+        while index_key is not None:
+            questions = self.questions()
+            self.store.reset(index_key, len(questions))
+            try:
+                for query in questions:
+                    answer = self._generate(query, index_key)
+                    if self._stop.is_set():
+                        self.store.finish("stopped")
+                        return
+                    if self.logic.index_fingerprint() != index_key:
+                        break
+                    self.store.put(query, answer)
+                else:
+                    self.store.finish()
+                    return
+            except Exception as e:
+                print(f"Erreur de pré-calcul des réponses: {e}")
+                self.store.finish("error")
+                return
+            # L'index a changé pendant le pré-calcul : on recommence sur la nouvelle version
+            self.store.finish("obsolete")
+            index_key = self.logic.index_fingerprint()
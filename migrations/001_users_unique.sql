@@ -0,0 +1,19 @@
+-- Contraintes d'unicité des comptes, sur lesquelles reposent l'inscription et la
+-- création en masse (INSERT ... ON CONFLICT DO NOTHING). À appliquer une fois :
+--
+--     psql -d "$DB_NAME" -f migrations/001_users_unique.sql
+--
+-- La migration échoue si des doublons existent déjà ; pour les lister :
+--
+--     SELECT username, count(*) FROM users GROUP BY 1 HAVING count(*) > 1;
+--     SELECT lower(trim(email)), count(*) FROM users GROUP BY 1 HAVING count(*) > 1;
+
+BEGIN;
+
+-- Les e-mails sont enregistrés en minuscules par l'application
+UPDATE users SET email = lower(trim(email)) WHERE email <> lower(trim(email));
+
+CREATE UNIQUE INDEX IF NOT EXISTS users_username_key ON users (username);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_lower_key ON users (lower(email));
+
+COMMIT;
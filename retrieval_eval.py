@@ -0,0 +1,214 @@
+"""
+Évaluation de la recherche documentaire et balayage des paramètres de découpage.
+
+    python retrieval_eval.py questions.jsonl
+    python retrieval_eval.py questions.jsonl --chunk-sizes 500,750,1000 --overlaps 100,150 \\
+        --ks 2,3,5 --budgets 1000,1500,2000
+    python retrieval_eval.py questions.jsonl --embeddings model --json > resultats.json
+
+Chaque ligne du jeu de questions donne les pages attendues (numérotées à partir de 1) :
+
+    {"question": "Quels sont les frais de scolarité ?", "expected": [{"source": "frais.pdf", "page": 2}]}
+
+Pour chaque découpage, l'index est construit dans un dossier temporaire comme en
+production (en-têtes retirés, déduplication, un shard par document) ; chaque k et
+chaque budget de contexte sont mesurés sur ce même index. Par défaut les embeddings
+sont calculés par hachage (déterministes, sans modèle) ; `--embeddings model`
+confirme le choix avec le vrai modèle.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import tempfile
+import time
+from backend.chatbot_logic import SYSTEM_PROMPT_PREFIX, select_context
+from backend.dedup import ChunkDeduplicator
+from backend.embeddings import HashingEmbeddings, get_embeddings
+from backend.index_builder import load_pdf_pages, split_documents
+from backend.sharded_index import ShardedIndex, ShardedRetriever, group_by_file
+
+
+def load_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            expected = {(os.path.basename(ref["source"]), int(ref["page"]) - 1) for ref in entry["expected"]}
+            if not expected:
+                raise ValueError(f"ligne {line_no} : aucune page attendue")
+            questions.append((entry["question"], expected))
+    return questions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def make_token_counter(tokenizer_path=None):
+    """Compteur de tokens : tokenizer Hugging Face si fourni, sinon ~4 caractères par token."""
+    if tokenizer_path:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+        return lambda text: len(tokenizer.encode(text))
+    return lambda text: math.ceil(len(text) / 4)
+
+
+def doc_refs(doc):
+    """Pages couvertes par un chunk, y compris celles des doublons fusionnés."""
+    refs = doc.metadata.get("sources") or [doc.metadata]
+    return {(os.path.basename(ref.get("source", "")), ref.get("page")) for ref in refs}
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _, filenames in os.walk(path)
+        for filename in filenames
+    )
+
+
+def build_setting(pages_by_file, chunk_size, chunk_overlap, embeddings, root, categories_file):
+    """Découpe, déduplique et indexe les pages ; retourne l'index et ses mesures."""
+    start = time.perf_counter()
+    chunks = []
+    for pages in pages_by_file.values():
+        chunks.extend(split_documents(pages, chunk_size, chunk_overlap))
+    by_file = group_by_file(ChunkDeduplicator().deduplicate(chunks))
+    index = ShardedIndex(os.path.join(root, f"shards-{chunk_size}-{chunk_overlap}"), lambda: embeddings, categories_file)
+    for filename in sorted(by_file):
+        index.build_shard(filename, by_file[filename])
+    return index, {
+        "chunks": len(chunks),
+        "indexed_chunks": index.ntotal,
+        "build_seconds": time.perf_counter() - start,
+        "index_bytes": directory_size(index.root),
+    }
+
+
+def evaluate(index, questions, k, budgets, count_tokens):
+    """recall@k, MRR et latence pour ce k ; rappel du contexte et tokens pour chaque budget."""
+    retriever = ShardedRetriever(index=index, k=k)
+    recalls, reciprocal_ranks, latencies = [], [], []
+    context_recalls = {budget: [] for budget in budgets}
+    prompt_tokens = {budget: [] for budget in budgets}
+
+    for question, expected in questions:
+        start = time.perf_counter()
+        docs = retriever.invoke(question)
+        latencies.append(time.perf_counter() - start)
+
+        found, first_rank = set(), None
+        for rank, doc in enumerate(docs, start=1):
+            hits = doc_refs(doc) & expected
+            if hits and first_rank is None:
+                first_rank = rank
+            found |= hits
+        recalls.append(len(found) / len(expected))
+        reciprocal_ranks.append(1 / first_rank if first_rank else 0.0)
+
+        for budget in budgets:
+            selected = select_context(docs, budget)
+            in_context = set().union(*(doc_refs(doc) for doc, _ in selected)) & expected
+            context_recalls[budget].append(len(in_context) / len(expected))
+            context = "\n\n".join(text for _, text in selected)
+            prompt = f"{SYSTEM_PROMPT_PREFIX}Contexte: {context}\nQuestion: {question}\nRéponse:\n"
+            prompt_tokens[budget].append(count_tokens(prompt))
+
+    latencies.sort()
+    common = {
+        "k": k,
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "latency_ms": statistics.mean(latencies) * 1000,
+        "latency_p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000,
+    }
+    return [
+        dict(
+            common,
+            budget=budget,
+            context_recall=statistics.mean(context_recalls[budget]),
+            prompt_tokens=statistics.mean(prompt_tokens[budget]),
+        )
+        for budget in budgets
+    ]
+
+
+def recommend(results, tolerance):
+    """Réglage le moins coûteux en tokens parmi ceux proches du meilleur rappel de contexte."""
+    best = max(r["context_recall"] for r in results)
+    candidates = [r for r in results if r["context_recall"] >= best - tolerance]
+    return min(candidates, key=lambda r: (r["prompt_tokens"], r["latency_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation de la recherche et balayage des paramètres")
+    parser.add_argument("questions", help="Jeu de questions annotées (JSONL)")
+    parser.add_argument("--pdfs", default="pdfs")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[500, 750, 1000])
+    parser.add_argument("--overlaps", type=_int_list, default=[100, 150])
+    parser.add_argument("--ks", type=_int_list, default=[2, 3, 5])
+    parser.add_argument("--budgets", type=_int_list, default=[1000, 1500, 2000])
+    parser.add_argument("--embeddings", choices=["hashing", "model"], default="hashing",
+                        help="hashing : déterministe, sans modèle ; model : modèle de production")
+    parser.add_argument("--tokenizer", help="Tokenizer Hugging Face pour compter les tokens du prompt")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Perte de rappel acceptée pour la recommandation")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    embeddings = HashingEmbeddings() if args.embeddings == "hashing" else get_embeddings()
+    count_tokens = make_token_counter(args.tokenizer)
+
+    pages_by_file = {}
+    for filename in sorted(f for f in os.listdir(args.pdfs) if f.endswith(".pdf")):
+        pages, _, _, error = load_pdf_pages(os.path.join(args.pdfs, filename))
+        if error:
+            print(f"Erreur lors du chargement de {filename}: {error}")
+        pages_by_file[filename] = pages
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="retrieval-eval-") as root:
+        for chunk_size in args.chunk_sizes:
+            for chunk_overlap in args.overlaps:
+                if chunk_overlap >= chunk_size:
+                    continue
+                index, build = build_setting(
+                    pages_by_file, chunk_size, chunk_overlap, embeddings, root,
+                    os.path.join(args.pdfs, "categories.json")
+                )
+                for k in args.ks:
+                    for row in evaluate(index, questions, k, args.budgets, count_tokens):
+                        results.append(dict(build, chunk_size=chunk_size, chunk_overlap=chunk_overlap, **row))
+
+    if not results:
+        print("Aucun réglage évalué.")
+        return
+    best = recommend(results, args.tolerance)
+    if args.json:
+        print(json.dumps({"questions": len(questions), "embeddings": args.embeddings,
+                          "results": results, "recommended": best}, indent=2))
+        return
+
+    print(f"{len(questions)} questions, embeddings : {args.embeddings}\n")
+    print(f"{'taille':>6} {'chev.':>5} {'k':>2} {'budget':>6} {'recall@k':>8} {'MRR':>5} {'ctx':>5} "
+          f"{'tokens':>6} {'chunks':>6} {'index':>8} {'constr.':>7} {'lat. ms':>7} {'p95':>6}")
+    for r in sorted(results, key=lambda r: (-r["context_recall"], r["prompt_tokens"])):
+        print(
+            f"{r['chunk_size']:>6} {r['chunk_overlap']:>5} {r['k']:>2} {r['budget']:>6} {r['recall']:>8.2f} "
+            f"{r['mrr']:>5.2f} {r['context_recall']:>5.2f} {r['prompt_tokens']:>6.0f} {r['indexed_chunks']:>6} "
+            f"{r['index_bytes'] / 1024:>7.0f}K {r['build_seconds']:>6.1f}s {r['latency_ms']:>7.1f} {r['latency_p95_ms']:>6.1f}"
+        )
+    print(
+        f"\nRecommandé : CHUNK_SIZE={best['chunk_size']} CHUNK_OVERLAP={best['chunk_overlap']} "
+        f"RETRIEVAL_K={best['k']} CONTEXT_BUDGET={best['budget']} "
+        f"(rappel du contexte {best['context_recall']:.2f}, ~{best['prompt_tokens']:.0f} tokens)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Profil du coût d'import au démarrage, par route de l'application.
+
+    python startup_benchmark.py            # tableau par route + modules les plus coûteux
+    python startup_benchmark.py --json     # sortie exploitable par une machine
+
+Chaque route est importée dans un interpréteur neuf avec `python -X importtime`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROUTES = {
+    "login": ["views.login"],
+    "register": ["views.register"],
+    "admin": ["views.admin"],
+    "chatbot": ["views.chatbot"],
+    "app": ["app"],
+}
+HEAVY_PACKAGES = ("torch", "transformers", "sentence_transformers", "faiss", "langchain", "ollama")
+
+
+def profile_route(modules):
+    code = "; ".join(f"import {m}" for m in modules)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - start
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append({
+            "module": name.strip(),
+            "self": int(self_us) / 1e6,
+            "cumulative": int(cumulative_us) / 1e6,
+        })
+
+    loaded = {entry["module"].split(".")[0] for entry in imports}
+    return {
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "wall": wall,
+        "import_time": sum(entry["self"] for entry in imports),
+        "modules": len(imports),
+        "heavy_loaded": sorted(p for p in HEAVY_PACKAGES if p in loaded),
+        "top": sorted(imports, key=lambda e: e["self"], reverse=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage par route")
+    parser.add_argument("--top", type=int, default=10, help="Nombre de modules les plus coûteux à afficher")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    for route, modules in ROUTES.items():
+        result = profile_route(modules)
+        result["top"] = result["top"][:args.top]
+        results[route] = result
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'Route':<10} {'Imports (s)':>12} {'Total (s)':>10} {'Modules':>8}  Pile ML chargée")
+    for route, result in results.items():
+        heavy = ", ".join(result["heavy_loaded"]) or "aucune"
+        status = "" if result["ok"] else f"  ⚠️ {result['error']}"
+        print(f"{route:<10} {result['import_time']:>12.2f} {result['wall']:>10.2f} {result['modules']:>8}  {heavy}{status}")
+
+    for route, result in results.items():
+        print(f"\n== {route} : modules les plus coûteux ==")
+        for entry in result["top"]:
+            print(f"  {entry['self'] * 1000:>9.1f} ms  {entry['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import importlib
+import threading
+import time
+
+# Pile ML du chatbot (LangChain, sentence-transformers, FAISS, Ollama) : inutile
+# pour les pages de connexion et d'inscription.
+CHATBOT_STACK = [
+    "sentence_transformers",
+    "faiss",
+    "langchain_huggingface",
+    "langchain_community.document_loaders",
+    "langchain_community.vectorstores",
+    "langchain_ollama",
+    "backend.chatbot_logic",
+    "views.chatbot",
+]
+
+_preload_thread = None
+_preload_lock = threading.Lock()
+# Durée d'import de chaque module préchargé (chaque module ne compte que ce qui
+# n'avait pas déjà été importé par les précédents)
+preload_timings = {}
+
+
+def _import_all(modules):
+    start_all = time.perf_counter()
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Préchargement de {name} impossible: {e}")
+            continue
+        preload_timings[name] = time.perf_counter() - start
+    slowest = sorted(preload_timings.items(), key=lambda item: item[1], reverse=True)[:3]
+    print(
+        f"Pile du chatbot préchargée en {time.perf_counter() - start_all:.1f} s "
+        f"({', '.join(f'{name} {seconds:.1f} s' for name, seconds in slowest)})"
+    )
+
+
+def preload_in_background(modules=CHATBOT_STACK):
+    """Importe la pile du chatbot dans un thread pendant que l'utilisateur s'authentifie.
+    Le verrou d'import de Python fait attendre un import concurrent au lieu de le dupliquer."""
+    global _preload_thread
+    with _preload_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(
+                target=_import_all, args=(list(modules),), name="chatbot-preload", daemon=True
+            )
+            _preload_thread.start()
+    return _preload_thread
@@ -0,0 +1,75 @@
+import os
+import time
+
+# 0 : rendu à chaque token, sans regroupement (mesure de référence « avant »)
+STREAM_MAX_FPS = float(os.getenv("STREAM_MAX_FPS", "8"))
+
+
+class ThrottledStreamRenderer:
+    """
+    Affiche une réponse diffusée token par token sans renvoyer tout le texte à chaque token :
+    le premier token est affiché immédiatement, les suivants sont regroupés et envoyés
+    au plus `max_fps` fois par seconde (ou dès que `flush_chars` caractères attendent).
+    Avec `max_fps=0`, chaque token est rendu : le coût mesuré est alors celui d'avant.
+    """
+
+    def __init__(self, placeholder, max_fps=STREAM_MAX_FPS, flush_chars=120, cursor="▌"):
+        self.placeholder = placeholder
+        self.throttled = max_fps > 0
+        self.min_interval = 1.0 / max_fps if self.throttled else 0.0
+        self.flush_chars = flush_chars if self.throttled else 0
+        self.cursor = cursor
+        self.parts = []
+        self.pending_chars = 0
+        self.last_flush = 0.0
+        self.tokens = 0
+        self.messages_sent = 0
+        self.chars_sent = 0
+        self.naive_chars = 0
+        self.render_cpu = 0.0
+        self.total_length = 0
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def push(self, chunk):
+        self.parts.append(chunk)
+        self.tokens += 1
+        self.pending_chars += len(chunk)
+        self.total_length += len(chunk)
+        # Volume qu'aurait envoyé un rendu à chaque token (calculé, non mesuré)
+        self.naive_chars += self.total_length + len(self.cursor)
+
+        now = time.monotonic()
+        if (self.messages_sent == 0
+                or self.pending_chars >= self.flush_chars
+                or now - self.last_flush >= self.min_interval):
+            self._render(self.text + self.cursor)
+            self.last_flush = now
+            self.pending_chars = 0
+
+    def finalize(self, text=None):
+        """Affiche une seule fois la version définitive, sans curseur."""
+        final = self.text if text is None else text
+        self._render(final)
+        return final
+
+    def _render(self, content):
+        start = time.thread_time()
+        self.placeholder.markdown(content)
+        self.render_cpu += time.thread_time() - start
+        self.messages_sent += 1
+        self.chars_sent += len(content)
+
+    def stats(self):
+        """Envois et CPU mesurés ; les valeurs `naive_*_estimate` sont calculées à partir
+        du nombre de tokens. Pour une mesure réelle d'avant, lancer avec STREAM_MAX_FPS=0."""
+        return {
+            "tokens": self.tokens,
+            "messages_sent": self.messages_sent,
+            "naive_messages_estimate": self.tokens + 1,
+            "chars_sent": self.chars_sent,
+            "naive_chars_estimate": self.naive_chars + self.total_length,
+            "render_cpu": self.render_cpu,
+        }
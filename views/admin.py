@@ -1,11 +1,46 @@
 import os
 import streamlit as st
 import base64
+import json
 from backend.admin_logic import AdminLogic
+from backend.corpus_manager import corpus_options
+from backend.memory_stats import snapshot as memory_snapshot, format_bytes
+from backend.warmup import AnswerStore
+from backend.dedup import load_report as load_dedup_report
+from views.chatbot import get_corpus_manager
+
+@st.cache_resource(show_spinner=False)
+def get_admin_logic(pdf_folder, catalog_table):
+    """Une connexion au catalogue par corpus et par processus, pas une par rerun."""
+    return AdminLogic(pdf_folder, catalog_table)
 
 class AdminPage:
     def __init__(self):
-        self.logic = AdminLogic()
+        self.corpus_manager = get_corpus_manager()
+        self.corpus_id = self.corpus_manager.default
+        self.logic = None
+
+    def select_corpus(self):
+        """Faculté administrée : dossier de PDFs, index et table du catalogue de ce corpus."""
+        corpora = self.corpus_manager.corpora
+        if len(corpora) > 1:
+            ids = list(corpora)
+            self.corpus_id = st.selectbox(
+                "🏛️ Faculté",
+                ids,
+                index=ids.index(self.corpus_manager.default),
+                format_func=lambda corpus_id: corpora[corpus_id]["name"],
+                key="admin_corpus"
+            )
+        self.config = corpora[self.corpus_id]
+        options = corpus_options(self.corpus_id, self.config, self.corpus_id == self.corpus_manager.default)
+        self.logic = get_admin_logic(self.config["pdf_folder"], options["catalog_table"])
+
+    def loaded_logic(self):
+        """Logique du corpus si elle est déjà chargée par le chatbot (sans la charger)."""
+        if self.corpus_manager.is_loaded(self.corpus_id):
+            return self.corpus_manager.get(self.corpus_id)
+        return None
 
     def _load_css(self):
         css_file = "assets/styles/admin.css"
@@ -25,7 +60,7 @@ class AdminPage:
         st.markdown(f"""
         <div class="admin-header">
             {'<img src="data:image/png;base64,' + logo_b64 + '" class="admin-logo"/>' if logo_b64 else '🎓'}
-            <h1>Chatbot Faculté des Sciences</h1>
+            <h1>Chatbot {self.config['name']}</h1>
             <h2>📚 Espace Administrateur</h2>
             <p>Gérez les documents PDF pour alimenter le chatbot</p>
         </div>
@@ -44,10 +79,45 @@ class AdminPage:
 
     def render_existing_files(self):
         st.markdown("<h3>📂 Fichiers existants</h3>", unsafe_allow_html=True)
-        files = self.logic.list_pdfs()
+
+        sort_options = {
+            "Nom": "name",
+            "Taille": "size_bytes",
+            "Pages": "page_count",
+            "Chunks": "chunk_count",
+            "Extraction (s)": "extraction_seconds",
+            "Embedding (s)": "embedding_seconds",
+            "État": "status",
+            "Dernière ingestion": "ingested_at",
+        }
+        per_page = 20
+        total = self.logic.count_pdfs()
+        pages = max((total + per_page - 1) // per_page, 1)
+
+        col_sort, col_order, col_page, col_sync = st.columns([3, 2, 2, 2])
+        with col_sort:
+            sort_label = st.selectbox("Trier par", list(sort_options), key="catalog_sort")
+        with col_order:
+            descending = st.toggle("Décroissant", key="catalog_desc")
+        with col_page:
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key="catalog_page")
+        with col_sync:
+            if self.logic.catalog.available and st.button("🔄 Synchroniser", key="catalog_sync"):
+                added = self.logic.sync_catalog()
+                st.success(f"{added} document(s) ajouté(s) au catalogue")
+
+        files = self.logic.list_pdfs(page, per_page, sort_options[sort_label], descending)
+        status_labels = {
+            "pending": "⏳ En attente",
+            "extracted": "📄 Extrait",
+            "indexed": "✅ Indexé",
+            "empty": "⚠️ Vide",
+            "error": "❌ Erreur",
+        }
         if files:
+            st.caption(f"{total} document(s) — page {page} / {pages}")
             for file in files:
-                col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+                col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 3, 2])
                 with col1:
                     st.markdown(f"**{file['name']}**")
                 with col2:
@@ -55,6 +125,18 @@ class AdminPage:
                 with col3:
                     st.caption(f"Modifié : {file['modified']}")
                 with col4:
+                    if "status" in file:
+                        details = status_labels.get(file["status"], file["status"])
+                        if file["pages"] is not None:
+                            details += f" · {file['pages']} p."
+                        if file["chunks"] is not None:
+                            details += f" · {file['chunks']} chunks"
+                        if file["extraction_seconds"] is not None:
+                            details += f" · extr. {file['extraction_seconds']:.1f} s"
+                        if file["embedding_seconds"] is not None:
+                            details += f" · emb. {file['embedding_seconds']:.1f} s"
+                        st.caption(details, help=file["error"] or None)
+                with col5:
                     if st.button("🗑 Supprimer", key=f"del_{file['name']}"):
                         if self.logic.delete_pdf(file["name"]):
                             st.success(f"{file['name']} supprimé ✅")
@@ -70,6 +152,114 @@ class AdminPage:
                 msg = self.logic.reindex()
             st.success(msg)
 
+    def render_cache(self):
+        st.markdown("<h3>🗑️ Cache des réponses</h3>", unsafe_allow_html=True)
+        logic = self.loaded_logic()
+        if logic is None:
+            st.info("Corpus non chargé : aucune réponse en cache.")
+            return
+        st.caption(f"{len(logic.cache_responses)} réponse(s) en cache, partagées par tous les étudiants")
+        if st.button("🗑️ Vider le cache", key="clear_response_cache"):
+            logic.cache_responses.clear()
+            st.success("Cache vidé !")
+
+    def render_warmup(self):
+        st.markdown("<h3>⚡ Réponses pré-calculées</h3>", unsafe_allow_html=True)
+        # Les compteurs de succès sont ceux de ce processus : on lit ceux du corpus chargé
+        logic = self.loaded_logic()
+        if logic is not None:
+            status = logic.answer_store.status()
+        else:
+            status = AnswerStore(self.config["index_dir"]).status()
+        progress = status["progress"]
+        if not progress:
+            st.info("Aucun pré-calcul effectué : il démarre après la prochaine construction de l'index.")
+            return
+
+        states = {
+            "running": "⏳ En cours",
+            "done": "✅ Terminé",
+            "obsolete": "♻️ Relancé (index modifié)",
+            "stopped": "⏹️ Interrompu (corpus libéré)",
+            "error": "❌ Erreur",
+        }
+        st.caption(f"État : {states.get(progress.get('state'), progress.get('state'))}")
+        if progress.get("total"):
+            st.progress(min(progress["done"] / progress["total"], 1.0))
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Réponses prêtes", f"{status['answers']} / {progress.get('total', 0)}")
+        col2.metric("Taux de succès", f"{status['hit_rate']:.0%}")
+        col3.metric("Requêtes servies", status["hits"])
+
+    def render_dedup(self):
+        st.markdown("<h3>🧹 Déduplication</h3>", unsafe_allow_html=True)
+        report = load_dedup_report(self.config["index_dir"])
+        if not report.get("chunks_in"):
+            st.info("Aucun rapport : il est produit à la prochaine construction de l'index.")
+            return
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Chunks indexés", f"{report['chunks_kept']} / {report['chunks_in']}")
+        col2.metric("Doublons exacts", report["exact_duplicates"])
+        col3.metric("Quasi-doublons", report["near_duplicates"])
+        col4.metric("Embedding évité", f"{report.get('embedding_seconds_saved', 0):.1f} s")
+        st.caption(
+            f"{report['removed_ratio']:.0%} des chunks retirés ({report['chars_removed']} caractères), "
+            f"seuil de similarité {report['threshold']:.2f}"
+        )
+
+        if report.get("boilerplate"):
+            with st.expander(f"📄 En-têtes et pieds de page retirés ({len(report['boilerplate'])} fichiers)"):
+                for filename, lines in sorted(report["boilerplate"].items()):
+                    st.markdown(f"**{filename}**")
+                    for line in lines:
+                        st.text(f"  {line}")
+
+        if report.get("groups"):
+            with st.expander(f"🔁 Chunks fusionnés ({len(report['groups'])} groupes principaux)"):
+                st.table([
+                    {
+                        "Occurrences": group["count"],
+                        "Sources": ", ".join(
+                            f"{ref['source']} p. {ref['page'] + 1}" if isinstance(ref["page"], int) else ref["source"]
+                            for ref in group["sources"]
+                        ),
+                        "Extrait": group["text"],
+                    }
+                    for group in report["groups"]
+                ])
+
+    def render_memory(self):
+        st.markdown("<h3>🧠 Mémoire du serveur</h3>", unsafe_allow_html=True)
+        if not st.button("📊 Mesurer la mémoire", key="memory_snapshot"):
+            return
+        with st.spinner("Mesure en cours..."):
+            snap = memory_snapshot()
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Mémoire résidente", format_bytes(snap["rss"]))
+        col2.metric("Sessions actives", snap["live_sessions"] if snap["live_sessions"] is not None else "?")
+        col3.metric("Instances du chatbot", snap["chatbot_logic_instances"])
+        col4.metric("ThreadPoolExecutor", snap["executors"])
+
+        labels = {
+            "embedding_model": "Modèle d'embedding",
+            "faiss_vectors": "Vecteurs FAISS",
+            "docstore": "Docstore",
+            "chunks": "Chunks",
+            "response_cache": "Cache des réponses",
+            "sessions": "État des sessions",
+        }
+        rows = [{"Composant": labels[name], "Taille": format_bytes(size)} for name, size in snap["components"].items()]
+        rows.append({"Composant": "Non attribué (Python, bibliothèques)", "Taille": format_bytes(snap["unattributed"])})
+        st.table(rows)
+        st.download_button(
+            "⬇️ Snapshot JSON",
+            data=json.dumps(snap, indent=2),
+            file_name=f"memory_{int(snap['timestamp'])}.json",
+            mime="application/json"
+        )
+
     def render(self):
         st.set_page_config(
             page_title="Chatbot FS - Admin",
@@ -77,6 +267,7 @@ class AdminPage:
             initial_sidebar_state="collapsed"
         )
         self._load_css()
+        self.select_corpus()
         self.render_header()
         st.markdown("---")
         self.render_upload()
@@ -84,3 +275,11 @@ class AdminPage:
         self.render_existing_files()
         st.markdown("---")
         self.render_reindex()
+        st.markdown("---")
+        self.render_cache()
+        st.markdown("---")
+        self.render_warmup()
+        st.markdown("---")
+        self.render_dedup()
+        st.markdown("---")
+        self.render_memory()
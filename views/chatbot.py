@@ -2,7 +2,10 @@ import os
 import streamlit as st
 import time
 from dotenv import load_dotenv
-from backend.chatbot_logic import OptimizedChatbotLogic
+from backend.corpus_manager import CorpusManager
+from backend.warmup import QUICK_QUESTIONS
+from utils.stream_renderer import ThrottledStreamRenderer, STREAM_MAX_FPS
+from utils.lazy_imports import preload_timings
 
 load_dotenv()
 
@@ -12,21 +15,58 @@ def load_custom_css():
         with open(css_file, "r", encoding="utf-8") as f:
             st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner=False)
+def get_corpus_manager():
+    """Corpus partagés par toutes les sessions : chaque index est chargé une seule fois,
+    à sa première utilisation, et libéré selon le budget mémoire."""
+    return CorpusManager()
+
+@st.cache_data(show_spinner=False)
+def load_base64_image(image_path):
+    try:
+        import base64
+        with open(image_path, "rb") as img_file:
+            return base64.b64encode(img_file.read()).decode()
+    except:
+        return ""
+
 class OptimizedChatbotUI:
-    def __init__(self, pdf_folder):
-        self.chatbot_logic = OptimizedChatbotLogic(pdf_folder)
+    def __init__(self, corpus=None):
+        self.corpus_manager = get_corpus_manager()
+        self.corpus_id = self.select_corpus(corpus)
+        self.corpus_name = self.corpus_manager.corpora[self.corpus_id]["name"]
+        self.chatbot_logic = self.current_logic()
         if "model_preloaded" not in st.session_state:
             with st.spinner("🔧 Initialisation du modèle..."):
                 self.chatbot_logic.preload_model()
             st.session_state.model_preloaded = True
 
+    def select_corpus(self, corpus):
+        """Corpus de la route (?corpus=...), sinon celui demandé ou déjà choisi par la session."""
+        requested = st.query_params.get("corpus") or corpus or st.session_state.get("corpus")
+        corpus_id = self.corpus_manager.resolve(requested)
+        if st.session_state.get("corpus") not in (None, corpus_id):
+            # Changement de faculté : nouvelle conversation
+            st.session_state.pop("messages", None)
+            st.session_state.pop("upgradable_query", None)
+        st.session_state.corpus = corpus_id
+        return corpus_id
+
+    def current_logic(self):
+        """Logique du corpus, redemandée au gestionnaire à chaque exécution : un corpus
+        évincé est rechargé au lieu de rester en mémoire par cette session."""
+        if self.corpus_manager.is_loaded(self.corpus_id):
+            logic = self.corpus_manager.get(self.corpus_id)
+        else:
+            with st.spinner("📚 Chargement des documents et de l'index..."):
+                logic = self.corpus_manager.get(self.corpus_id)
+        if logic.needs_sync(st.session_state):
+            with st.spinner("📚 Chargement des documents et de l'index..."):
+                logic.ensure_ready(st.session_state)
+        return logic
+
     def get_base64_image(self, image_path):
-        try:
-            import base64
-            with open(image_path, "rb") as img_file:
-                return base64.b64encode(img_file.read()).decode()
-        except:
-            return ""
+        return load_base64_image(image_path)
 
     def render_header(self):
         logo_path = "assets/images/logo.png"
@@ -36,7 +76,7 @@ class OptimizedChatbotUI:
                 {'<img src="data:image/png;base64,' + self.get_base64_image(logo_path) + '" class="logo-header"/>' if os.path.exists(logo_path) else '🎓'}
                 Chatbot FS-UEb ⚡
             </h1>
-            <p>Assistant Intelligent Optimisé - Faculté des Sciences, Université d'Ebolowa</p>
+            <p>Assistant Intelligent Optimisé - {self.corpus_name}, Université d'Ebolowa</p>
         </div>
         """
         st.markdown(header_html, unsafe_allow_html=True)
@@ -50,7 +90,20 @@ class OptimizedChatbotUI:
                 st.markdown("🎓", unsafe_allow_html=True)
             
             st.markdown('<div class="sidebar-title">Chatbot FS-UEb ⚡</div>', unsafe_allow_html=True)
-            st.markdown('<div class="sidebar-subtitle">Université d\'Ebolowa<br/>Faculté des Sciences</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="sidebar-subtitle">Université d\'Ebolowa<br/>{self.corpus_name}</div>', unsafe_allow_html=True)
+            
+            corpora = self.corpus_manager.corpora
+            if len(corpora) > 1:
+                ids = list(corpora)
+                choice = st.selectbox(
+                    "🏛️ Faculté",
+                    ids,
+                    index=ids.index(self.corpus_id),
+                    format_func=lambda corpus_id: corpora[corpus_id]["name"]
+                )
+                if choice != self.corpus_id:
+                    st.query_params["corpus"] = choice
+                    st.rerun()
             
             st.markdown("---")
             
@@ -63,10 +116,58 @@ class OptimizedChatbotUI:
             ]
             for opt in optimizations:
                 st.markdown(f"<small>{opt}</small>", unsafe_allow_html=True)
-            
+
+            llm_stats = self.chatbot_logic.llm_manager.stats()
+            for kind, label in (("cold", "à froid"), ("warm", "à chaud")):
+                avg = llm_stats[f"ttft_{kind}_avg"]
+                if avg is not None:
+                    st.caption(f"⏱️ Premier token {label} : {avg:.2f} s ({llm_stats[f'ttft_{kind}_count']} requêtes)")
+
+            if preload_timings:
+                st.caption(
+                    f"📦 Bibliothèques préchargées pendant la connexion : {sum(preload_timings.values()):.1f} s",
+                    help="\n".join(f"{name} : {seconds:.2f} s" for name, seconds in preload_timings.items())
+                )
+
+            stream_stats = st.session_state.get("stream_stats")
+            if stream_stats and stream_stats["answers"]:
+                cpu_ms = stream_stats['render_cpu'] * 1000 / stream_stats['answers']
+                if STREAM_MAX_FPS > 0:
+                    st.caption(
+                        f"📡 Envois au navigateur : {stream_stats['messages_sent']} "
+                        f"(≈ {stream_stats['naive_messages_estimate']} estimés sans regroupement), "
+                        f"{cpu_ms:.1f} ms CPU/réponse mesurés"
+                    )
+                else:
+                    st.caption(
+                        f"📡 Rendu à chaque token (référence) : {stream_stats['messages_sent']} envois, "
+                        f"{cpu_ms:.1f} ms CPU/réponse mesurés"
+                    )
+
+            routing = self.chatbot_logic.router.stats()
+            if routing["counts"]["fast"]:
+                st.caption(
+                    f"⚡ Réponses rapides : {routing['counts']['fast']} / "
+                    f"{sum(routing['counts'].values())} (≈ {routing['estimated_time_saved']:.1f} s gagnées)"
+                )
+
+            retrieval = self.chatbot_logic.retrieval_cache.stats()
+            if retrieval["hits"]:
+                st.caption(
+                    f"🔁 Recherches servies par le cache : {retrieval['hit_ratio']:.0%} "
+                    f"(≈ {retrieval['time_saved']:.1f} s gagnées)"
+                )
+
+            degradation = self.chatbot_logic.degradation.stats()
+            if degradation["extractive"]:
+                st.caption(
+                    f"🛟 Réponses extractives (surcharge) : {degradation['extractive']} "
+                    f"({degradation['fallback_rate']:.0%} des requêtes)"
+                )
+
             st.markdown("---")
             st.markdown("### ℹ️ Informations")
-            st.info("Ce chatbot est optimisé pour répondre rapidement aux questions basées sur les documents de la Faculté des Sciences. Posez vos questions en toute simplicité !")
+            st.info(f"Ce chatbot est optimisé pour répondre rapidement aux questions basées sur les documents de la {self.corpus_name}. Posez vos questions en toute simplicité !")
             
             st.markdown("---")
             st.markdown("### 🔧 Fonctionnalités")
@@ -78,11 +179,12 @@ class OptimizedChatbotUI:
             - 🎯 Interface moderne
             """)
             
-            if st.button("🗑️ Vider le cache"):
-                self.chatbot_logic.cache_responses.clear()
+            # Le cache des réponses est partagé par toutes les sessions : seul
+            # l'administrateur peut le vider (page admin).
+            if st.button("🗑️ Effacer la conversation"):
                 if hasattr(st.session_state, 'messages'):
                     st.session_state.messages = []
-                st.success("Cache vidé !")
+                st.success("Conversation effacée !")
                 st.rerun()
 
     def render_performance_metrics(self):
@@ -96,7 +198,7 @@ class OptimizedChatbotUI:
             )
         
         with col2:
-            docs_loaded = len(getattr(st.session_state, 'texts', []))
+            docs_loaded = len(self.chatbot_logic.texts or [])
             st.metric(
                 label="📚 Documents chargés", 
                 value=docs_loaded,
@@ -114,20 +216,13 @@ class OptimizedChatbotUI:
     def render_quick_questions(self):
         st.markdown("### 💬 Questions rapides")
         
-        quick_questions = [
-            "Quels sont les programmes d'études disponibles ?",
-            "Comment s'inscrire à la faculté ?",
-            "Quels sont les frais de scolarité ?",
-            "Où trouve-t-on les emplois du temps ?"
-        ]
-        
         cols = st.columns(2)
-        for i, question in enumerate(quick_questions):
+        for i, question in enumerate(QUICK_QUESTIONS):
             with cols[i % 2]:
                 if st.button(f"❓ {question}", key=f"quick_{i}"):
                     st.session_state.messages.append({"role": "user", "content": question})
                     st.session_state.pending_query = question
-                    st.rerun()
+                    st.rerun(scope="fragment")
 
     def render_typing_animation(self, text, placeholder):
         displayed_text = ""
@@ -136,12 +231,13 @@ class OptimizedChatbotUI:
             placeholder.markdown(f"**{displayed_text}**")
             time.sleep(0.02)
 
-    def process_query_streaming(self, user_query, status_placeholder, response_placeholder):
-        full_response = ""
+    def process_query_streaming(self, user_query, status_placeholder, response_placeholder, allow_fallback=True):
+        renderer = ThrottledStreamRenderer(response_placeholder)
         current_status = ""
+        st.session_state.pop("upgradable_query", None)
         
         try:
-            for msg_type, content in self.chatbot_logic.run_query_with_status(user_query):
+            for msg_type, content in self.chatbot_logic.run_query_with_status(user_query, allow_fallback):
                 if msg_type == "status":
                     current_status = content
                     status_placeholder.markdown(f"**{current_status}**")
@@ -151,11 +247,15 @@ class OptimizedChatbotUI:
                         status_placeholder.empty()
                         current_status = ""
                     
-                    full_response += content
-                    response_placeholder.markdown(full_response + "▌")
+                    renderer.push(content)
+                
+                elif msg_type == "fallback":
+                    # Réponse extractive servie pendant une surcharge : proposer la version générée
+                    st.session_state.upgradable_query = user_query
             
             status_placeholder.empty()
-            response_placeholder.markdown(full_response)
+            full_response = renderer.finalize()
+            self.record_stream_stats(renderer.stats())
             
             return full_response
             
@@ -165,43 +265,16 @@ class OptimizedChatbotUI:
             response_placeholder.markdown(error_msg)
             return error_msg
 
-    def render(self):
-        st.set_page_config(
-            page_title="Chatbot FS-UEb ⚡",
-            layout="centered",
-            initial_sidebar_state="collapsed"
-        )
-        
-        load_custom_css()
-        self.render_header()
-        self.render_sidebar()
-        
-        with st.spinner("📚 Chargement des documents..."):
-            self.chatbot_logic.prepare_data(st.session_state)
-        
-        with st.spinner("🔍 Initialisation de l'index..."):
-            self.chatbot_logic.load_index(st.session_state)
-        
-        self.render_performance_metrics()
-        st.markdown("---")
-        
-        st.markdown('<div class="fade-in">', unsafe_allow_html=True)
-        
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-            welcome_msg = """
-            👋 Bonjour ! Je suis votre assistant intelligent optimisé pour la Faculté des Sciences.
-            
-            ⚡ **Nouvelles fonctionnalités** :
-            - Interface fluide et réactive
-            - Streaming en temps réel
-            - Statuts de traitement visibles
-            - Réponses plus naturelles
-            
-            Posez-moi vos questions sur les documents de la faculté !
-            """
-            st.session_state.messages.append({"role": "assistant", "content": welcome_msg})
+    def record_stream_stats(self, stats):
+        totals = st.session_state.setdefault("stream_stats", {"answers": 0})
+        totals["answers"] += 1
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
 
+    @st.fragment
+    def render_conversation(self):
+        """Zone de conversation isolée : envoyer un message ne réexécute que ce fragment."""
+        self.chatbot_logic = self.current_logic()
         st.session_state.messages = st.session_state.messages[-15:]
 
         for message in st.session_state.messages:
@@ -212,18 +285,25 @@ class OptimizedChatbotUI:
             self.render_quick_questions()
             st.markdown("---")
 
+        upgradable_query = st.session_state.get("upgradable_query")
+        if upgradable_query and not hasattr(st.session_state, 'pending_query'):
+            if st.button("🤖 Générer une réponse complète", key="upgrade_answer"):
+                st.session_state.pending_query = upgradable_query
+                st.session_state.force_generate = True
+                st.rerun(scope="fragment")
+
         if hasattr(st.session_state, 'pending_query'):
             user_query = st.session_state.pending_query
             delattr(st.session_state, 'pending_query')
-            
-            with st.chat_message("user"):
-                st.markdown(user_query)
+            allow_fallback = not st.session_state.pop("force_generate", False)
             
             with st.chat_message("assistant"):
                 status_placeholder = st.empty()
                 response_placeholder = st.empty()
                 
-                response = self.process_query_streaming(user_query, status_placeholder, response_placeholder)
+                response = self.process_query_streaming(
+                    user_query, status_placeholder, response_placeholder, allow_fallback
+                )
                 st.session_state.messages.append({"role": "assistant", "content": response})
 
         if user_query := st.chat_input("💬 Votre question (tapez puis Entrée)..."):
@@ -237,6 +317,39 @@ class OptimizedChatbotUI:
                 
                 response = self.process_query_streaming(user_query, status_placeholder, response_placeholder)
                 st.session_state.messages.append({"role": "assistant", "content": response})
+
+    def render(self):
+        st.set_page_config(
+            page_title="Chatbot FS-UEb ⚡",
+            layout="centered",
+            initial_sidebar_state="collapsed"
+        )
+        
+        load_custom_css()
+        self.render_header()
+        self.render_sidebar()
+        
+        self.render_performance_metrics()
+        st.markdown("---")
+        
+        st.markdown('<div class="fade-in">', unsafe_allow_html=True)
+        
+        if "messages" not in st.session_state:
+            st.session_state.messages = []
+            welcome_msg = f"""
+            👋 Bonjour ! Je suis votre assistant intelligent optimisé pour la {self.corpus_name}.
+            
+            ⚡ **Nouvelles fonctionnalités** :
+            - Interface fluide et réactive
+            - Streaming en temps réel
+            - Statuts de traitement visibles
+            - Réponses plus naturelles
+            
+            Posez-moi vos questions sur les documents de la faculté !
+            """
+            st.session_state.messages.append({"role": "assistant", "content": welcome_msg})
+
+        self.render_conversation()
         
         st.markdown('</div>', unsafe_allow_html=True)
         st.markdown("---")